@@ -0,0 +1,241 @@
+"""Walk-forward backtest of the LSTM forecaster.
+
+Usage: python backtest.py [TICKER ...] [--step 10] [--years 5] [--budget-minutes 60] [--output FILE]
+
+For each fold, the model is trained on the history before a cutoff. It then forecasts the
+next HORIZON closes the same way predict_single_stock does, and the forecast is compared
+with the realised prices. Cutoffs advance by `step` bars. Within a run of folds, the model
+and the windowed dataset are carried forward, and each fold only fine-tunes on the windows
+that became available since the previous cutoff. Runs of folds are spread over worker
+processes, which read the closes from one shared-memory price matrix. Once the time
+budget is spent, the remaining folds are skipped.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+# Directory holding one JSON report per backtest run
+BACKTEST_DIR = os.environ.get(
+    "STOCK_BACKTEST_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "backtests")
+)
+
+# Bars between successive cutoffs (one forecast horizon by default)
+STEP = 10
+
+# History fetched per ticker, and bars required before the first cutoff
+YEARS = 5
+MIN_TRAIN_BARS = 250
+
+
+def fold_cutoffs(n_bars, lookback, horizon, step=STEP, min_train=MIN_TRAIN_BARS):
+    """Cutoffs c such that closes[:c] are known and closes[c:c+horizon] are realised"""
+    first = max(min_train, lookback + horizon + 1)
+    return list(range(first, n_bars - horizon + 1, step))
+
+
+def split_segments(cutoffs, segments):
+    """Split cutoffs into at most `segments` contiguous runs of similar length"""
+    segments = max(1, min(segments, len(cutoffs)))
+    size = math.ceil(len(cutoffs) / segments)
+    return [cutoffs[i:i + size] for i in range(0, len(cutoffs), size)]
+
+
+def run_segment(ticker, closes, cutoffs, epochs=None, fine_tune_epochs=None, deadline=None):
+    """Walk a contiguous run of cutoffs for one ticker.
+
+    The first fold trains from scratch. Later folds fine-tune the same model on the new
+    windows, reusing one set of window views over the scaled series, unless the prices
+    leave the scaler's range, in which case the scaler is refit and the model retrained.
+    Folds are skipped once time.time() passes `deadline`.
+    Returns (ticker, [(cutoff, forecast, realised), ...]).
+    """
+    from model import FINE_TUNE_EPOCHS, ForecastContext, TrainingConfig, _scaler_covers, build_model
+    from tracing import span
+    # Same early stopping and validation split as production training, without the interactive budget
+    training = TrainingConfig() if epochs is None else TrainingConfig(epochs=epochs)
+    fine_tune_epochs = FINE_TUNE_EPOCHS if fine_tune_epochs is None else fine_tune_epochs
+
+    data = np.asarray(closes, dtype=np.float64).reshape(-1, 1)
+    context = ForecastContext(ticker)
+    lookback, horizon = context.lookback, context.horizon
+    model, X, y, trained = None, None, None, 0
+    folds = []
+    for cutoff in cutoffs:
+        if deadline is not None and time.time() > deadline:
+            break
+        with span('backtest_fold', ticker):
+            # Window i targets bars [i + lookback, i + lookback + horizon), so these end by the cutoff
+            n_train = cutoff - lookback - horizon + 1
+            if model is None or not _scaler_covers(context.scaler, data[:cutoff]):
+                context.scaler.fit(data[:cutoff])
+                X, y = context.prepare(data, fit=False)
+                model = build_model()
+                with span('fit', ticker):
+                    training.fit(model, X[:n_train], y[:n_train])
+            elif n_train > trained:
+                with span('fine_tune', ticker):
+                    training.fit(model, X[trained:n_train], y[trained:n_train], epochs=fine_tune_epochs)
+            trained = n_train
+
+            window = context.transform(data[cutoff - lookback:cutoff]).reshape(1, lookback, 1)
+            with span('predict', ticker):
+                forecast = context.inverse_transform(model(window, training=False).numpy().reshape(-1, 1)).ravel()
+            # Anchor the first forecast point to the last known close, as predict_single_stock does
+            forecast = forecast * (data[cutoff - 1, 0] / forecast[0])
+            folds.append((cutoff, forecast, data[cutoff:cutoff + horizon, 0].copy()))
+    return ticker, folds
+
+
+def _run_shared_segment(ticker, cutoffs, epochs=None, fine_tune_epochs=None, deadline=None):
+    """Worker task: run_segment on the ticker's closes from the shared price matrix.
+
+    Returns (ticker, folds, timings), with this task's stage histograms for the parent to merge.
+    """
+    import tracing
+    from shared_prices import worker_series
+    try:
+        ticker, folds = run_segment(ticker, worker_series(ticker).values, cutoffs, epochs, fine_tune_epochs,
+                                    deadline)
+    except Exception:
+        tracing.drain()
+        raise
+    return ticker, folds, tracing.drain()
+
+
+def summarize(folds, planned=None):
+    """Error metrics over every forecast point of a ticker's folds.
+
+    `naive_rmse` is the error of repeating the last known close, as a baseline the model
+    should beat.
+    """
+    if not folds:
+        return {'folds': 0, 'planned_folds': planned}
+    folds = sorted(folds, key=lambda fold: fold[0])
+    forecasts = np.array([fold[1] for fold in folds])
+    realised = np.array([fold[2] for fold in folds])
+    # Forecasts are anchored, so their first point is the last known close
+    last_close = forecasts[:, :1]
+    errors = forecasts - realised
+    return {
+        'folds': len(folds),
+        'planned_folds': planned,
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'mae': float(np.mean(np.abs(errors))),
+        'mape': float(np.mean(np.abs(errors) / realised) * 100),
+        'naive_rmse': float(np.sqrt(np.mean((last_close - realised) ** 2))),
+        'rmse_by_step': np.sqrt(np.mean(errors ** 2, axis=0)).round(4).tolist(),
+        'first_cutoff': int(folds[0][0]),
+        'last_cutoff': int(folds[-1][0]),
+    }
+
+
+def backtest(tickers=None, step=STEP, years=YEARS, min_train=MIN_TRAIN_BARS, workers=None,
+             budget_seconds=None, epochs=None, fine_tune_epochs=None):
+    """Walk-forward backtest of every ticker, with runs of folds spread over worker processes.
+
+    Returns {ticker: metrics}. Tickers without enough history are reported with 0 folds.
+    """
+    import tracing
+    from model import HORIZON, LOOKBACK, WORKER_TF_THREADS, _init_worker, fetch_shared_prices
+    from universe import load_universe
+    tickers = list(dict.fromkeys(tickers if tickers else load_universe()))
+    deadline = time.time() + budget_seconds if budget_seconds else None
+    workers = workers or max(1, (os.cpu_count() or 1) // WORKER_TF_THREADS)
+
+    # Loaded once into shared memory; workers read each ticker's closes from it
+    shared = fetch_shared_prices(tickers, years=years)
+    if shared is None:
+        return {ticker: summarize([], 0) for ticker in tickers}
+
+    plans = {}
+    for ticker in tickers:
+        data = shared.series(ticker) if ticker in shared else None
+        if data is None:
+            continue
+        cutoffs = fold_cutoffs(len(data), LOOKBACK, HORIZON, step, min_train)
+        if cutoffs:
+            plans[ticker] = cutoffs
+
+    # With fewer tickers than workers, each ticker's folds are split into several runs
+    segments_per_ticker = max(1, math.ceil(workers / max(1, len(plans))))
+    tasks = [(ticker, segment) for ticker, cutoffs in plans.items()
+             for segment in split_segments(cutoffs, segments_per_ticker)]
+
+    folds = {ticker: [] for ticker in tickers}
+    try:
+        if tasks:
+            # Spawn rather than fork for the same reason as model.predict_many
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                     mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker,
+                                     initargs=(WORKER_TF_THREADS, shared.handle)) as pool:
+                futures = [pool.submit(_run_shared_segment, ticker, segment, epochs, fine_tune_epochs, deadline)
+                           for ticker, segment in tasks]
+                for future in as_completed(futures):
+                    try:
+                        ticker, segment_folds, timings = future.result()
+                        folds[ticker].extend(segment_folds)
+                        tracing.merge(timings)
+                    except Exception as e:
+                        print(f"Backtest segment failed: {e}")
+    finally:
+        shared.close()
+
+    return {ticker: summarize(folds[ticker], len(plans.get(ticker, []))) for ticker in tickers}
+
+
+def save_report(results, path=None, **settings):
+    """Write results and run settings as JSON (default: BACKTEST_DIR/<date>.json); returns the path"""
+    path = path or os.path.join(BACKTEST_DIR, f"{datetime.now():%Y%m%d}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    report = {'created_at': datetime.now().isoformat(timespec='seconds'), 'settings': settings, 'results': results}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def print_table(results):
+    print(f"{'Ticker':<16}{'Folds':>9}{'RMSE':>10}{'MAE':>10}{'MAPE %':>9}{'Naive RMSE':>12}")
+    for ticker, metrics in results.items():
+        folds = f"{metrics['folds']}/{metrics['planned_folds']}"
+        if not metrics['folds']:
+            print(f"{ticker:<16}{folds:>9}")
+            continue
+        print(f"{ticker:<16}{folds:>9}{metrics['rmse']:>10.2f}{metrics['mae']:>10.2f}"
+              f"{metrics['mape']:>9.2f}{metrics['naive_rmse']:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the LSTM forecaster")
+    parser.add_argument('tickers', nargs='*', help="tickers to backtest (default: the configured universe)")
+    parser.add_argument('--step', type=int, default=STEP, help="bars between cutoffs")
+    parser.add_argument('--years', type=int, default=YEARS, help="years of history per ticker")
+    parser.add_argument('--min-train', type=int, default=MIN_TRAIN_BARS, help="bars before the first cutoff")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes")
+    parser.add_argument('--budget-minutes', type=float, default=None, help="stop starting folds after this long")
+    parser.add_argument('--epochs', type=int, default=None, help="epochs when training from scratch")
+    parser.add_argument('--fine-tune-epochs', type=int, default=None, help="epochs per fine-tuning fold")
+    parser.add_argument('--output', help="report path (default: .cache/backtests/<date>.json)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    budget = args.budget_minutes * 60 if args.budget_minutes else None
+    results = backtest(args.tickers, args.step, args.years, args.min_train, args.workers, budget,
+                       args.epochs, args.fine_tune_epochs)
+    print_table(results)
+    path = save_report(results, args.output, step=args.step, years=args.years, min_train=args.min_train,
+                       budget_minutes=args.budget_minutes, epochs=args.epochs,
+                       fine_tune_epochs=args.fine_tune_epochs)
+    print(f"Backtest finished in {time.perf_counter() - started:.1f}s; report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""Offline benchmarks for the forecasting, recommendation and database hot paths.
+
+Usage:
+    python benchmark.py [--quick] [--output results.json]
+    python benchmark.py --compare baseline.json [--threshold 0.2]
+    python benchmark.py --fixtures DIR   # use <TICKER>.csv price fixtures instead of synthetic series
+
+Everything runs offline: prices come from synthetic series (or CSV fixtures) served through
+the price cache in a temporary directory, and db.py runs against a local SQLite stand-in.
+Results are written as JSON with seconds, throughput and peak traced memory per case. With
+--compare, cases slower than the baseline by more than the threshold (and by more than
+--min-delta seconds, the noise floor) are flagged and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import sqlite3
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import price_cache
+
+HISTORY_LENGTHS = [500, 2000, 10000]
+UNIVERSE_SIZES = [5, 50, 500]
+QUICK_HISTORY_LENGTHS = [500, 2000]
+QUICK_UNIVERSE_SIZES = [5, 50]
+
+# Fast cases are looped until one sample takes at least this long (as timeit's autorange does)
+MIN_SAMPLE_SECONDS = 0.2
+
+# Slowdowns smaller than this are timer noise and never flagged, whatever the percentage
+MIN_DELTA_SECONDS = 0.002
+
+SQLITE_SCHEMA = '''
+CREATE TABLE users_data (
+    user_id VARCHAR(8) PRIMARY KEY, user_name VARCHAR(255) NOT NULL, password VARCHAR(255) NOT NULL,
+    city VARCHAR(255), phone_no VARCHAR(20), address TEXT
+);
+CREATE TABLE single_predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id VARCHAR(8), stock_name VARCHAR(50),
+    time_period INT, predicted_profit FLOAT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE recommendation_predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id VARCHAR(8), stock_name VARCHAR(50),
+    investment_amount FLOAT, time_period INT, predicted_profit FLOAT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+'''
+
+
+def synthetic_prices(length, seed=0, start_price=1000.0):
+    """Geometric random walk of daily closes"""
+    rng = np.random.default_rng(seed)
+    return start_price * np.exp(np.cumsum(rng.normal(0.0004, 0.015, length)))
+
+
+def write_fixtures(directory, tickers, length):
+    """Write synthetic <TICKER>.csv fixtures ending yesterday"""
+    end = datetime.today() - timedelta(days=1)
+    dates = pd.bdate_range(end=end, periods=length)
+    for i, ticker in enumerate(tickers):
+        pd.DataFrame({'Date': dates, 'Close': synthetic_prices(length, seed=i)}).to_csv(
+            os.path.join(directory, f"{ticker}.csv"), index=False)
+
+
+def measure(fn, repeat=3, items=1, unit='items', loop=True):
+    """Best-of-`repeat` wall time per call plus peak traced memory of one extra run.
+
+    With `loop`, calls faster than MIN_SAMPLE_SECONDS are repeated within each sample so
+    sub-millisecond cases are not dominated by timer noise. Pass loop=False for cases that
+    must run exactly `repeat` times (cold caches, slow training).
+    """
+    timer = timeit.Timer(fn)
+    number = 1
+    if loop:
+        while True:
+            elapsed = timer.timeit(number)
+            if elapsed >= MIN_SAMPLE_SECONDS:
+                break
+            number *= max(2, min(10, int(MIN_SAMPLE_SECONDS / max(elapsed, 1e-9)) + 1))
+    times = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(times)
+    return {
+        'seconds': best,
+        'mean_seconds': sum(times) / len(times),
+        'throughput': items / best if best > 0 else None,
+        'unit': f"{unit}/s",
+        'peak_mb': peak / 2**20,
+        'loops': number,
+    }
+
+
+class SQLiteCursor:
+    """Just enough of a mysql.connector cursor for db.py, backed by sqlite3"""
+
+    def __init__(self, connection, dictionary=False):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace('%s', '?'), params)
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(query.replace('%s', '?'), seq_of_params)
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {col[0]: value for col, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Local stand-in for a MySQL connection so the db.py paths run without a server"""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._connection, dictionary)
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLitePool:
+    """Stand-in for mysql.connector.pooling.MySQLConnectionPool, handing out SQLiteConnections"""
+
+    def __init__(self, path, pool_size=5):
+        self.pool_size = pool_size
+        self._idle = queue.Queue()
+        for _ in range(pool_size):
+            self._idle.put(SQLiteConnection(path))
+
+    def get_connection(self):
+        return PooledSQLiteConnection(self, self._idle.get(block=False))
+
+
+class PooledSQLiteConnection:
+    """Like mysql's PooledMySQLConnection: close() returns the connection to its pool"""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        self._pool._idle.put(self._connection)
+
+
+def bench_prepare_data(lengths, results):
+    from model import ForecastContext
+    for length in lengths:
+        data = synthetic_prices(length).reshape(-1, 1)
+        stats = measure(lambda: ForecastContext('BENCH').prepare(data), repeat=5, items=length, unit='bars')
+        results.append({'name': 'prepare_data', 'params': {'history': length}, **stats})
+
+
+def bench_fit(lengths, epochs, results):
+    from model import ForecastContext, build_model, BATCH_SIZE
+    for length in lengths:
+        X, y = ForecastContext('BENCH').prepare(synthetic_prices(length).reshape(-1, 1))
+        fit = lambda: build_model().fit(X, y, epochs=epochs, batch_size=BATCH_SIZE, verbose=0)
+        stats = measure(fit, repeat=1, items=len(X) * epochs, unit='samples', loop=False)
+        results.append({'name': 'build_model+fit', 'params': {'history': length, 'epochs': epochs}, **stats})
+
+
+def bench_predict(results):
+    from model import ForecastContext, LOOKBACK, build_model
+    from numpy_runtime import NumpyForecaster, export_npz
+    context = ForecastContext('BENCH')
+    X, y = context.prepare(synthetic_prices(500).reshape(-1, 1))
+    net = build_model()
+    net.fit(X, y, epochs=1, verbose=0)
+    window = X[-1:].copy()
+    calls = 20
+    stats = measure(lambda: [net.predict(window, verbose=0) for _ in range(calls)], items=calls, unit='predictions')
+    results.append({'name': 'predict', 'params': {'runtime': 'keras', 'lookback': LOOKBACK}, **stats})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.npz')
+        export_npz(net, context.scaler, path)
+        forecaster = NumpyForecaster.load(path)
+    prices = synthetic_prices(LOOKBACK)
+    stats = measure(lambda: [forecaster.predict(prices) for _ in range(calls)], items=calls, unit='predictions')
+    results.append({'name': 'predict', 'params': {'runtime': 'numpy', 'lookback': LOOKBACK}, **stats})
+
+
+def bench_recommendations(sizes, fixtures_dir, results):
+    from model import predict_all_stocks
+    saved = price_cache.FIXTURES_DIR, price_cache.CACHE_DIR
+    try:
+        for size in sizes:
+            with tempfile.TemporaryDirectory(prefix='bench-') as tmp:
+                if fixtures_dir:
+                    tickers = sorted(name[:-4] for name in os.listdir(fixtures_dir) if name.endswith('.csv'))[:size]
+                    source_dir = fixtures_dir
+                else:
+                    tickers = [f"SYN{i:04d}.NS" for i in range(size)]
+                    source_dir = os.path.join(tmp, 'fixtures')
+                    os.makedirs(source_dir)
+                    write_fixtures(source_dir, tickers, 520)
+                price_cache.FIXTURES_DIR = source_dir
+                price_cache.CACHE_DIR = os.path.join(tmp, 'cache')
+
+                run = lambda: predict_all_stocks(100000, 30, tickers=tickers, top_k=3, seed=0)
+                # The first call fills the empty cache from the fixtures; later calls are cache hits
+                stats = measure(run, repeat=1, items=len(tickers), unit='tickers', loop=False)
+                results.append({'name': 'predict_all_stocks', 'params': {'universe': len(tickers), 'cache': 'cold'},
+                                **stats})
+                stats = measure(run, repeat=3, items=len(tickers), unit='tickers')
+                results.append({'name': 'predict_all_stocks', 'params': {'universe': len(tickers), 'cache': 'warm'},
+                                **stats})
+    finally:
+        price_cache.FIXTURES_DIR, price_cache.CACHE_DIR = saved
+
+
+def bench_db(results, n_rows=200):
+    import db
+    with tempfile.TemporaryDirectory(prefix='bench-db-') as tmp:
+        _bench_db(db, os.path.join(tmp, 'stock_prediction.sqlite'), results, n_rows)
+
+
+def _bench_db(db, path, results, n_rows):
+    setup = sqlite3.connect(path)
+    setup.executescript(SQLITE_SCHEMA)
+    setup.execute("INSERT INTO users_data VALUES ('bench001', 'bench', 'x', '', '', '')")
+    # A fixed history, queried before the save cases add (a loop-dependent number of) rows
+    setup.executemany("INSERT INTO single_predictions (user_id, stock_name, time_period, predicted_profit) "
+                      "VALUES ('bench001', 'TCS', 10, ?)", [(float(i),) for i in range(n_rows)])
+    setup.executemany("INSERT INTO recommendation_predictions (user_id, stock_name, investment_amount, time_period, "
+                      "predicted_profit) VALUES ('bench001', 'INFY', 10000, 30, ?)", [(float(i),) for i in range(n_rows)])
+    setup.commit()
+    setup.close()
+
+    db.init_pool(SQLitePool(path, db.POOL_SIZE))
+    # Saves are queued, so each case includes the flush that writes them
+    save_single = lambda: ([db.save_single_prediction('bench001', 'TCS', 10, 12.5) for _ in range(n_rows)],
+                           db.flush_writes())
+    save_rec = lambda: ([db.save_recommendation_prediction('bench001', 'INFY', 10000, 30, 250.0) for _ in range(n_rows)],
+                        db.flush_writes())
+    history = lambda: db.get_user_predictions('bench001')
+    results.append({'name': 'db.get_user_predictions', 'params': {'limit': 50},
+                    **measure(history, repeat=10, items=1, unit='queries')})
+    results.append({'name': 'db.save_single_prediction', 'params': {'rows': n_rows},
+                    **measure(save_single, items=n_rows, unit='rows')})
+    results.append({'name': 'db.save_recommendation_prediction', 'params': {'rows': n_rows},
+                    **measure(save_rec, items=n_rows, unit='rows')})
+
+
+def run(args):
+    lengths = QUICK_HISTORY_LENGTHS if args.quick else HISTORY_LENGTHS
+    sizes = QUICK_UNIVERSE_SIZES if args.quick else UNIVERSE_SIZES
+    epochs = 1 if args.quick else args.epochs
+    only = set(args.only.split(',')) if args.only else None
+    results = []
+    if not only or 'prepare_data' in only:
+        bench_prepare_data(lengths, results)
+    if not only or 'fit' in only:
+        bench_fit(lengths, epochs, results)
+    if not only or 'predict' in only:
+        bench_predict(results)
+    if not only or 'recommend' in only:
+        bench_recommendations(sizes, args.fixtures, results)
+    if not only or 'db' in only:
+        bench_db(results)
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'quick': args.quick,
+        },
+        'results': results,
+    }
+
+
+def _key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(current, baseline, threshold, min_delta=MIN_DELTA_SECONDS):
+    """Print per-case changes against a baseline; returns the list of regressed cases.
+
+    A case regresses when it is slower by more than `threshold` and by more than
+    `min_delta` seconds, so tiny cases cannot fail on noise alone.
+    """
+    previous = {_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = previous.get(_key(result))
+        if old is None:
+            print(f"  NEW   {result['name']} {result['params']}: {result['seconds']:.4f}s")
+            continue
+        change = result['seconds'] / old['seconds'] - 1 if old['seconds'] else 0.0
+        slower = change > threshold and result['seconds'] - old['seconds'] > min_delta
+        flag = 'SLOWER' if slower else 'ok'
+        print(f"  {flag:6} {result['name']} {result['params']}: "
+              f"{old['seconds']:.4f}s -> {result['seconds']:.4f}s ({change:+.1%})")
+        if slower:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark forecasting and recommendation hot paths")
+    parser.add_argument('--quick', action='store_true', help="smaller sizes and 1 training epoch")
+    parser.add_argument('--epochs', type=int, default=10, help="training epochs for the fit benchmark")
+    parser.add_argument('--only', help="comma separated subset: prepare_data,fit,predict,recommend,db")
+    parser.add_argument('--fixtures', help="directory of <TICKER>.csv files to use instead of synthetic prices")
+    parser.add_argument('--output', help="write results JSON here (default: stdout)")
+    parser.add_argument('--compare', help="baseline results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument('--min-delta', type=float, default=MIN_DELTA_SECONDS,
+                        help="slowdowns under this many seconds are never flagged")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Comparing against {args.compare} (threshold {args.threshold:.0%})")
+        regressions = compare(report, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
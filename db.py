@@ -1,181 +1,422 @@
-import mysql.connector
-from mysql.connector import Error
+import atexit
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from mysql.connector import Error, pooling
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
 from datetime import datetime
- 
-def create_connection():
-    try:   
-        connection = mysql.connector.connect(    
-            host="localhost",             
-            user="**",#replace with your username     
-            password="**",#replace with your password  
-            database="stock_prediction"  
-        ) 
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
+import tracing
+from tracing import span
 
-def register_user(user_id, username, password, city, phone, address):
-    conn = create_connection()
-    if conn:
+# Connection settings, from the environment so credentials stay out of the source
+DB_CONFIG = {
+    'host': os.environ.get("STOCK_DB_HOST", "localhost"),
+    'port': int(os.environ.get("STOCK_DB_PORT", "3306")),
+    'user': os.environ.get("STOCK_DB_USER", "root"),
+    'password': os.environ.get("STOCK_DB_PASSWORD", ""),
+    'database': os.environ.get("STOCK_DB_NAME", "stock_prediction"),
+}
+
+# Connections kept open, and seconds to wait for a free one before giving up
+POOL_SIZE = int(os.environ.get("STOCK_DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.environ.get("STOCK_DB_POOL_TIMEOUT", "10"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def reset_pool_stats():
+    with _stats_lock:
+        _stats.update(checkouts=0, in_use=0, peak_in_use=0, wait_seconds=0.0, max_wait_seconds=0.0,
+                      timeouts=0, errors=0)
+
+
+reset_pool_stats()
+
+
+def pool_stats():
+    """Pool usage since start (or reset_pool_stats): checkouts, connections in use now and at
+    peak, total and longest wait for a connection, timeouts and connection errors"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['size'] = _pool.pool_size if _pool is not None else POOL_SIZE
+    stats['mean_wait_seconds'] = stats['wait_seconds'] / stats['checkouts'] if stats['checkouts'] else 0.0
+    return stats
+
+
+def _install_pool(pool):
+    global _pool, _slots
+    if pool is None:
+        # Sessions are not reset on return: queries here set no session state, and the
+        # reset would cost a round trip per checkout
+        pool = pooling.MySQLConnectionPool(pool_name="stock_prediction", pool_size=POOL_SIZE,
+                                           pool_reset_session=False, **DB_CONFIG)
+    _slots = threading.BoundedSemaphore(pool.pool_size)
+    _pool = pool
+    return pool
+
+
+def init_pool(pool=None):
+    """Create the connection pool from DB_CONFIG, or install `pool` (any object with
+    get_connection() and pool_size, e.g. a stand-in for benchmarks). Returns the pool."""
+    with _pool_lock:
+        return _install_pool(pool)
+
+
+def _get_pool():
+    # Created on first use, so importing db needs no running server
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _install_pool(None)
+    return _pool
+
+
+@contextmanager
+def connection():
+    """A pooled connection, returned to the pool when the block exits.
+
+    Waits up to POOL_TIMEOUT for a free connection. The pool pings each connection as it is
+    handed out and reconnects it if the server dropped it. Raises mysql.connector.Error
+    (PoolError on timeout) if no working connection is available.
+    """
+    pool = _get_pool()
+    slots = _slots
+    started = time.perf_counter()
+    if not slots.acquire(timeout=POOL_TIMEOUT):
+        with _stats_lock:
+            _stats['timeouts'] += 1
+        raise PoolError(f"No database connection free after {POOL_TIMEOUT:g}s")
+    waited = time.perf_counter() - started
+    tracing.observe('db_pool_wait', waited)
+    try:
         try:
-            cursor = conn.cursor()
-            cursor.execute('''
+            conn = pool.get_connection()
+        except Error:
+            with _stats_lock:
+                _stats['errors'] += 1
+            raise
+        with _stats_lock:
+            _stats['checkouts'] += 1
+            _stats['in_use'] += 1
+            _stats['peak_in_use'] = max(_stats['peak_in_use'], _stats['in_use'])
+            _stats['wait_seconds'] += waited
+            _stats['max_wait_seconds'] = max(_stats['max_wait_seconds'], waited)
+        try:
+            yield conn
+        except BaseException:
+            # Don't hand a half-finished transaction to the next user
+            try:
+                conn.rollback()
+            except Error:
+                pass
+            raise
+        finally:
+            with _stats_lock:
+                _stats['in_use'] -= 1
+            # For a pooled connection, close() hands it back to the pool
+            conn.close()
+    finally:
+        slots.release()
+
+
+@contextmanager
+def cursor(dictionary=False, conn=None):
+    """A cursor on `conn`, or on a pooled connection held for the block"""
+    if conn is None:
+        with connection() as conn:
+            with cursor(dictionary, conn) as cur:
+                yield cur
+        return
+    cur = conn.cursor(dictionary=dictionary)
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+
+def register_user(user_id, username, password, city, phone, address):
+    try:
+        with connection() as conn, cursor(conn=conn) as cur:
+            cur.execute('''
                 INSERT INTO users_data (user_id, user_name, password, city, phone_no, address)
                 VALUES (%s, %s, %s, %s, %s, %s)
             ''', (user_id, username, password, city, phone, address))
             conn.commit()
             return True
-        except Error as e:
-            print(f"Error registering user: {e}")
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
+    except Error as e:
+        print(f"Error registering user: {e}")
+        return False
 
 def login_user(username, password):
-    conn = create_connection()
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
+    try:
+        with cursor(dictionary=True) as cur:
+            cur.execute('''
                 SELECT user_id FROM users_data WHERE user_name=%s AND password=%s
             ''', (username, password))
-            result = cursor.fetchone()
+            result = cur.fetchone()
             return result['user_id'] if result else None
-        except Error as e:
-            print(f"Error logging in: {e}")
-            return None
-        finally:
-            cursor.close()
-            conn.close()
-    return None
+    except Error as e:
+        print(f"Error logging in: {e}")
+        return None
+
+# Statements for queued writes, filled from each row tuple with executemany
+INSERTS = {
+    'single_predictions': '''
+        INSERT INTO single_predictions
+        (user_id, stock_name, time_period, predicted_profit)
+        VALUES (%s, %s, %s, %s)
+    ''',
+    'recommendation_predictions': '''
+        INSERT INTO recommendation_predictions
+        (user_id, stock_name, investment_amount, time_period, predicted_profit)
+        VALUES (%s, %s, %s, %s, %s)
+    ''',
+}
+
+# Queued rows are written once a batch reaches WRITE_BATCH_SIZE rows, or WRITE_INTERVAL
+# seconds after the oldest one was queued
+WRITE_BATCH_SIZE = int(os.environ.get("STOCK_DB_WRITE_BATCH", "100"))
+WRITE_INTERVAL = float(os.environ.get("STOCK_DB_WRITE_INTERVAL", "2"))
+
+# Attempts per batch after connection-level failures, with exponential backoff from WRITE_RETRY_DELAY
+WRITE_ATTEMPTS = 4
+WRITE_RETRY_DELAY = 0.5
+
+# Longest wait at interpreter exit for queued rows to be written
+SHUTDOWN_TIMEOUT = 30
+
+# Longest a history read waits for queued rows first; an unreachable server fails the read fast
+READ_FLUSH_TIMEOUT = float(os.environ.get("STOCK_DB_READ_FLUSH_TIMEOUT", "1"))
+
+# Errors worth retrying: the server or the pool was unavailable, not the data rejected
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, PoolError)
+
+
+class WriteBehindQueue:
+    """Collects INSERT rows and writes them on a background thread with executemany.
+
+    put() only queues the row, so callers on the UI thread never wait for the database.
+    Batches are written by size or age, and retried with backoff after transient errors.
+    A batch the server rejects is retried row by row, so one bad row doesn't lose the rest.
+    flush() waits until everything queued so far is written; close() also stops the thread.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, interval=WRITE_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {'queued': 0, 'written': 0, 'batches': 0, 'retries': 0, 'dropped': 0}
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['pending'] = stats['queued'] - stats['written'] - stats['dropped']
+        return stats
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def put(self, table, row):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-write-behind', daemon=True)
+                self._thread.start()
+        self._count('queued')
+        self._queue.put((table, row))
+
+    def flush(self, timeout=None):
+        """Write everything queued so far; True once done, False on timeout"""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Flush and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        pending = {}
+        deadline = None
+        while True:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+            if isinstance(item, tuple):
+                table, row = item
+                pending.setdefault(table, []).append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.interval
+                if sum(len(rows) for rows in pending.values()) < self.batch_size:
+                    continue
+            # A full batch, the interval passing, a flush request or shutdown: write it all
+            for table, rows in pending.items():
+                self._write(table, rows)
+            pending, deadline = {}, None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is self._STOP:
+                return
+
+    def _write(self, table, rows):
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                with span('db_write'), connection() as conn, cursor(conn=conn) as cur:
+                    cur.executemany(INSERTS[table], rows)
+                    conn.commit()
+                self._count('written', len(rows))
+                self._count('batches')
+                return
+            except TRANSIENT_ERRORS as e:
+                if attempt == WRITE_ATTEMPTS - 1:
+                    print(f"Dropping {len(rows)} {table} rows after {WRITE_ATTEMPTS} attempts: {e}")
+                    break
+                self._count('retries')
+                time.sleep(WRITE_RETRY_DELAY * 2 ** attempt)
+            except Exception as e:
+                # Rejected data isn't retried as is; any exception is caught so the writer thread survives
+                if len(rows) > 1:
+                    for row in rows:
+                        self._write(table, [row])
+                    return
+                print(f"Error saving {table} row: {e}")
+                break
+        self._count('dropped', len(rows))
+
+
+_writes = WriteBehindQueue()
+atexit.register(_writes.close, SHUTDOWN_TIMEOUT)
+
+
+def flush_writes(timeout=None):
+    """Wait until every queued prediction is written; False if `timeout` passes first"""
+    return _writes.flush(timeout)
+
+
+def close_writes(timeout=SHUTDOWN_TIMEOUT):
+    """Write the queued predictions and stop the writer, waiting at most `timeout`.
+
+    The exit hook then finds no writer left and returns at once, so shutdown waits once.
+    """
+    _writes.close(timeout)
+
+
+def write_stats():
+    """Write-behind queue counters: rows queued, written, pending and dropped, batches and retries"""
+    return _writes.stats()
+
 
 def save_single_prediction(user_id, stock_name, time_period, predicted_profit):
-    conn = create_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            # Convert None values to appropriate SQL NULL
-            time_period = time_period if time_period is not None else 0
-            predicted_profit = predicted_profit if predicted_profit is not None else 0
-            
-            cursor.execute('''
-                INSERT INTO single_predictions 
-                (user_id, stock_name, time_period, predicted_profit)
-                VALUES (%s, %s, %s, %s)
-            ''', (
-                user_id,
-                stock_name,
-                int(time_period),
-                float(predicted_profit)
-            ))
-            conn.commit()
-            return True
-        except Error as e:
-            print(f"Error saving single prediction: {e}")
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
+    """Queue a single-stock prediction for writing; returns True once queued"""
+    # Convert None values to appropriate SQL NULL
+    time_period = time_period if time_period is not None else 0
+    predicted_profit = predicted_profit if predicted_profit is not None else 0
+    _writes.put('single_predictions', (
+        user_id,
+        stock_name,
+        int(time_period),
+        float(predicted_profit)
+    ))
+    return True
 
 def save_recommendation_prediction(user_id, stock_name, investment_amount, time_period, predicted_profit):
-    conn = create_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            # Convert None values to appropriate SQL NULL
-            investment_amount = investment_amount if investment_amount is not None else 0
-            time_period = time_period if time_period is not None else 0
-            predicted_profit = predicted_profit if predicted_profit is not None else 0
-            
-            cursor.execute('''
-                INSERT INTO recommendation_predictions 
-                (user_id, stock_name, investment_amount, time_period, predicted_profit)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (
-                user_id,
-                stock_name,
-                float(investment_amount),
-                int(time_period),
-                float(predicted_profit)
-            ))
-            conn.commit()
-            return True
-        except Error as e:
-            print(f"Error saving recommendation prediction: {e}")
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
+    """Queue a recommendation for writing; returns True once queued"""
+    # Convert None values to appropriate SQL NULL
+    investment_amount = investment_amount if investment_amount is not None else 0
+    time_period = time_period if time_period is not None else 0
+    predicted_profit = predicted_profit if predicted_profit is not None else 0
+    _writes.put('recommendation_predictions', (
+        user_id,
+        stock_name,
+        float(investment_amount),
+        int(time_period),
+        float(predicted_profit)
+    ))
+    return True
 
-def get_user_single_predictions(user_id):
-    conn = create_connection()
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                SELECT 
+def get_user_single_predictions(user_id, conn=None):
+    try:
+        with cursor(dictionary=True, conn=conn) as cur:
+            cur.execute('''
+                SELECT
                     stock_name,
                     time_period,
                     predicted_profit,
                     timestamp as prediction_time
-                FROM single_predictions 
-                WHERE user_id=%s 
+                FROM single_predictions
+                WHERE user_id=%s
                 ORDER BY timestamp DESC
                 LIMIT 50
             ''', (user_id,))
-            return cursor.fetchall()
-        except Error as e:
-            print(f"Error fetching single predictions: {e}")
-            return []
-        finally:
-            cursor.close()
-            conn.close()
-    return []
+            return cur.fetchall()
+    except Error as e:
+        print(f"Error fetching single predictions: {e}")
+        return []
 
-def get_user_recommendation_predictions(user_id):
-    conn = create_connection()
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                SELECT 
+def get_user_recommendation_predictions(user_id, conn=None):
+    try:
+        with cursor(dictionary=True, conn=conn) as cur:
+            cur.execute('''
+                SELECT
                     stock_name,
                     investment_amount as amount,
                     time_period,
                     predicted_profit,
                     timestamp as prediction_time
-                FROM recommendation_predictions 
-                WHERE user_id=%s 
+                FROM recommendation_predictions
+                WHERE user_id=%s
                 ORDER BY timestamp DESC
                 LIMIT 50
             ''', (user_id,))
-            return cursor.fetchall()
-        except Error as e:
-            print(f"Error fetching recommendation predictions: {e}")
-            return []
-        finally:
-            cursor.close()
-            conn.close()
-    return []
+            return cur.fetchall()
+    except Error as e:
+        print(f"Error fetching recommendation predictions: {e}")
+        return []
 
 def get_user_predictions(user_id):
     """Get all predictions for a user (both single and recommendation)"""
-    single_predictions = get_user_single_predictions(user_id)
+    # Include predictions still waiting in the write-behind queue
+    flush_writes(READ_FLUSH_TIMEOUT)
+    try:
+        # Both queries share one pooled connection
+        with connection() as conn:
+            single_predictions = get_user_single_predictions(user_id, conn)
+            recommendation_predictions = get_user_recommendation_predictions(user_id, conn)
+    except Error as e:
+        print(f"Error fetching predictions: {e}")
+        return []
     for pred in single_predictions:
         pred['prediction_type'] = 'single'
         pred['amount'] = None  # Single predictions don't have amount
-    
-    recommendation_predictions = get_user_recommendation_predictions(user_id)
+
     for pred in recommendation_predictions:
         pred['prediction_type'] = 'recommendation'
-    
+
     # Combine and sort by timestamp (newest first)
     all_predictions = single_predictions + recommendation_predictions
     all_predictions.sort(key=lambda x: x['prediction_time'], reverse=True)
-    
+
     return all_predictions
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from datetime import datetime, time, timedelta
+
+import numpy as np
+
+from price_series import PriceSeries
+
+# Directory holding one JSON file of precomputed results per ticker
+STORE_DIR = os.environ.get(
+    "STOCK_FORECAST_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "forecasts")
+)
+
+# NSE closing time (local exchange time); results computed before it are stale afterwards
+MARKET_CLOSE = time(15, 30)
+
+_lock = threading.Lock()
+
+
+def last_market_close(now=None):
+    """Most recent weekday market close at or before `now`"""
+    now = now or datetime.now()
+    day = now.date()
+    if now.time() < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return datetime.combine(day, MARKET_CLOSE)
+
+
+def _path(ticker):
+    return os.path.join(STORE_DIR, ticker.replace('/', '_') + '.json')
+
+
+def load_entry(ticker):
+    """Return everything stored for a ticker ({'forecast': ..., 'stats': ...}) or {}"""
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable forecast entry for {ticker}: {e}")
+        return {}
+
+
+def _save_section(ticker, section, payload):
+    payload['computed_at'] = datetime.now().isoformat(timespec='seconds')
+    with _lock:
+        os.makedirs(STORE_DIR, exist_ok=True)
+        entry = load_entry(ticker)
+        entry[section] = payload
+        path = _path(ticker)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def is_stale(section, now=None):
+    """True if a stored section is missing or was computed before the last market close"""
+    if not section or 'computed_at' not in section:
+        return True
+    return datetime.fromisoformat(section['computed_at']) < last_market_close(now)
+
+
+def save_forecast(ticker, prediction, actual, band=None):
+    """Store a forecast; `actual` is the PriceSeries of recent closes it was compared against
+    and `band` the optional {'mean', 'lower', 'upper'} confidence band"""
+    _save_section(ticker, 'forecast', {
+        'prediction': [float(p) for p in prediction],
+        'actual': actual.values.tolist() if actual is not None else None,
+        'actual_dates': [str(day) for day in actual.index] if actual is not None else None,
+        'band': {key: [float(v) for v in values] for key, values in band.items()} if band else None,
+    })
+
+
+def _forecast_result(ticker, section):
+    """(prediction, actual PriceSeries, band) from a stored forecast section"""
+    actual = None
+    if section.get('actual') and section.get('actual_dates'):
+        actual = PriceSeries(np.array(section['actual_dates'], dtype='datetime64[D]'), section['actual'], ticker)
+    band = {key: np.array(values) for key, values in section['band'].items()} if section.get('band') else None
+    return np.array(section['prediction']), actual, band
+
+
+def save_stats(ticker, stats):
+    _save_section(ticker, 'stats', dict(stats))
+
+
+def _predict_numpy(ticker, callbacks=None, training=None):
+    """(prediction, actual, None) from the ticker's exported checkpoint, without training"""
+    from numpy_runtime import forecast_tickers
+    result = forecast_tickers([ticker]).get(ticker)
+    if result is None:
+        print(f"No exported checkpoint to serve {ticker} without TensorFlow")
+        return None, None, None
+    return result[0], result[1], None
+
+
+def get_forecast(ticker, callbacks=None, training=None):
+    """Return (prediction, actual, band) from the store, computing and storing it on demand if missing or stale.
+
+    `callbacks` and the `training` config are forwarded to training when the forecast has to be computed.
+    """
+    section = load_entry(ticker).get('forecast')
+    if not is_stale(section):
+        return _forecast_result(ticker, section)
+
+    try:
+        from model import predict_single_stock
+    except ImportError:
+        # Without TensorFlow, serve the newest exported checkpoint through the NumPy runtime
+        predict_single_stock = _predict_numpy
+    prediction, actual, band = predict_single_stock(ticker, callbacks, training)
+    if prediction is not None:
+        save_forecast(ticker, prediction, actual, band)
+        return prediction, actual, band
+    if section:
+        # Serving yesterday's forecast beats showing nothing
+        print(f"Serving stale forecast for {ticker} computed at {section['computed_at']}")
+        return _forecast_result(ticker, section)
+    return None, None, None
+
+
+def get_return_stats(tickers):
+    """Return {ticker: stats} for predict_all_stocks, fetching only missing or stale tickers"""
+    stats, missing = {}, []
+    for ticker in tickers:
+        section = load_entry(ticker).get('stats')
+        if is_stale(section):
+            missing.append(ticker)
+        else:
+            stats[ticker] = {k: v for k, v in section.items() if k != 'computed_at'}
+
+    if missing:
+        from model import fetch_return_stats
+        fresh = fetch_return_stats(missing)
+        for ticker in missing:
+            if ticker in fresh:
+                save_stats(ticker, fresh[ticker])
+                stats[ticker] = fresh[ticker]
+    # Keep the caller's ticker order
+    return {ticker: stats[ticker] for ticker in tickers if ticker in stats}
@@ -0,0 +1,159 @@
+import numpy as np
+from keras.models import Model # type: ignore
+from keras.layers import Concatenate, Dense, Embedding, Flatten, Input, LSTM, RepeatVector # type: ignore
+
+import model_registry
+from price_series import PriceSeries
+from model import (STOCKS, LOOKBACK, HORIZON, LSTM_UNITS, EPOCHS, BATCH_SIZE,
+                   ForecastContext, fetch_price_matrix)
+
+# Size of the learned per-ticker vector fed alongside the price window
+EMBEDDING_DIM = 4
+
+# Registry name under which the shared model is checkpointed
+REGISTRY_NAME = "__global__"
+
+
+def build_global_model(n_tickers=0, embedding_dim=EMBEDDING_DIM):
+    """Shared LSTM over normalised windows; adds a ticker embedding when n_tickers > 0"""
+    prices = Input(shape=(LOOKBACK, 1), name='prices')
+    inputs, x = [prices], prices
+    if n_tickers:
+        ticker_id = Input(shape=(1,), dtype='int32', name='ticker_id')
+        embedded = Flatten()(Embedding(n_tickers, embedding_dim)(ticker_id))
+        # Repeat the ticker vector at every time step so the LSTM sees it with each price
+        x = Concatenate()([prices, RepeatVector(LOOKBACK)(embedded)])
+        inputs.append(ticker_id)
+    x = LSTM(LSTM_UNITS, return_sequences=True)(x)
+    x = LSTM(LSTM_UNITS)(x)
+    model = Model(inputs, Dense(HORIZON)(x))
+    model.compile(optimizer='adam', loss='mse')
+    return model
+
+
+class GlobalForecaster:
+    """One LSTM trained on the whole universe and served with a single batched predict"""
+
+    def __init__(self, tickers=None, use_embedding=True):
+        # Requested universe (keys the checkpoint); self.tickers keeps those actually trained
+        self.universe = list(tickers if tickers is not None else STOCKS)
+        self.tickers = list(self.universe)
+        self.use_embedding = use_embedding
+        self.model = None
+        self.end_date = None
+        # Per-ticker min-max parameters, aligned with self.tickers
+        self.mins = None
+        self.ranges = None
+
+    def hparams(self):
+        return {
+            'lookback': LOOKBACK,
+            'horizon': HORIZON,
+            'units': LSTM_UNITS,
+            'epochs': EPOCHS,
+            'batch_size': BATCH_SIZE,
+            'tickers': self.universe,
+            'embedding_dim': EMBEDDING_DIM if self.use_embedding else 0,
+        }
+
+    def _build(self):
+        return build_global_model(len(self.tickers) if self.use_embedding else 0)
+
+    def _inputs(self, X, ids):
+        return [X, ids] if self.use_embedding else X
+
+    def fit(self, matrix=None, epochs=EPOCHS):
+        """Train once on the windows of every ticker in the universe"""
+        matrix = fetch_price_matrix(self.tickers) if matrix is None else matrix
+        if matrix is None:
+            raise ValueError("No price data to train the global model on")
+
+        tickers, mins, ranges, X_parts, y_parts, id_parts = [], [], [], [], [], []
+        for ticker in self.tickers:
+            if ticker not in matrix.columns:
+                continue
+            prices = PriceSeries.from_pandas(matrix[ticker], ticker)
+            if len(prices) < LOOKBACK + HORIZON + 1:
+                continue
+            # Each ticker is min-max normalised on its own range
+            context = ForecastContext(ticker)
+            X, y = context.prepare(prices.column())
+            tickers.append(ticker)
+            mins.append(context.scaler.data_min_[0])
+            ranges.append(context.scaler.data_range_[0])
+            X_parts.append(X)
+            y_parts.append(y)
+            id_parts.append(np.full(len(X), len(tickers) - 1, dtype=np.int32))
+        if not tickers:
+            raise ValueError("Not enough price history for any ticker")
+
+        self.tickers = tickers
+        self.mins = np.array(mins)
+        self.ranges = np.where(np.array(ranges) > 0, ranges, 1.0)
+        self.model = self._build()
+        X, y, ids = np.concatenate(X_parts), np.concatenate(y_parts), np.concatenate(id_parts)
+        self.model.fit(self._inputs(X, ids), y, epochs=epochs, batch_size=BATCH_SIZE, shuffle=True, verbose=0)
+        self.end_date = matrix.index[-1].date()
+        return self
+
+    def predict(self, matrix=None):
+        """Forecast every trained ticker in one batched call.
+
+        Returns {ticker: (prediction, actual)}, like predict_single_stock without the band.
+        """
+        if self.model is None:
+            raise ValueError("GlobalForecaster has not been trained")
+        matrix = fetch_price_matrix(self.tickers) if matrix is None else matrix
+        if matrix is None:
+            return {}
+
+        rows, windows, actuals = [], [], []
+        for row, ticker in enumerate(self.tickers):
+            if ticker not in matrix.columns:
+                continue
+            prices = PriceSeries.from_pandas(matrix[ticker], ticker)
+            if len(prices) < LOOKBACK:
+                continue
+            rows.append(row)
+            windows.append(prices.values[-LOOKBACK:])
+            actuals.append(prices[-HORIZON:])
+        if not rows:
+            return {}
+
+        rows = np.array(rows)
+        mins, ranges = self.mins[rows, None], self.ranges[rows, None]
+        X = ((np.array(windows) - mins) / ranges)[..., np.newaxis].astype(np.float32)
+        predictions = self.model.predict(self._inputs(X, rows.astype(np.int32)), verbose=0) * ranges + mins
+
+        # Anchor each forecast to its last actual price, as predict_single_stock does
+        last = np.array([actual.last for actual in actuals])
+        predictions = predictions * (last / predictions[:, 0])[:, None]
+        return {self.tickers[row]: (predictions[i], actuals[i]) for i, row in enumerate(rows)}
+
+    def save(self):
+        params = {'tickers': self.tickers, 'mins': self.mins, 'ranges': self.ranges}
+        # The embedding model has no NumPy runtime export
+        model_registry.save(REGISTRY_NAME, self.model, params, self.end_date, self.hparams(), export=False)
+
+    def load_latest(self):
+        """Load the newest stored global model for this universe; returns False if none"""
+        entry = model_registry.latest(REGISTRY_NAME, self.hparams())
+        if entry is None:
+            return False
+        params = model_registry.load_scaler(entry)
+        self.tickers, self.mins, self.ranges = params['tickers'], params['mins'], params['ranges']
+        self.model = model_registry.load_model(entry, self._build)
+        self.end_date = entry['end_date']
+        return True
+
+
+def predict_universe(tickers=None, use_embedding=True):
+    """Train (or load) the shared model and return forecasts for the whole universe"""
+    forecaster = GlobalForecaster(tickers, use_embedding)
+    matrix = fetch_price_matrix(forecaster.tickers)
+    if matrix is None:
+        return {}
+    if not forecaster.load_latest() or forecaster.end_date != matrix.index[-1].date():
+        forecaster = GlobalForecaster(forecaster.universe, use_embedding).fit(matrix)
+        forecaster.save()
+    return forecaster.predict(matrix)
@@ -0,0 +1,78 @@
+"""Report how long the GUI takes to import and which heavy modules it pulls in.
+
+Usage: python import_report.py [--budget SECONDS] [--top N]
+
+Exits with status 1 if importing the GUI loads any of HEAVY_MODULES or takes
+longer than the budget, so startup regressions show up in CI or a pre-commit run.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that must not be imported before the login window appears
+HEAVY_MODULES = ['tensorflow', 'keras', 'sklearn', 'yfinance', 'matplotlib']
+
+
+def measure(statement):
+    """Run `statement` in a fresh interpreter with -X importtime.
+
+    Returns {module: (cumulative_seconds, depth)} for every imported module,
+    where depth 0 marks modules imported directly by the statement.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level after the separator
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        timings[name.strip()] = (int(cumulative) / 1e6, depth)
+    return timings
+
+
+def report(statement, top):
+    timings = measure(statement)
+    # Only direct imports, so nested imports aren't counted twice
+    roots = {name: t for name, (t, depth) in timings.items() if depth == 0}
+    total = sum(roots.values())
+    print(f"{statement}: {total:.3f}s across {len(timings)} modules")
+    for name, t in sorted(roots.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {t:8.3f}s  {name}")
+    heavy = sorted(name for name in timings if name in HEAVY_MODULES)
+    return total, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GUI import-time report")
+    parser.add_argument('--budget', type=float, default=1.5, help="max seconds allowed for `import interface`")
+    parser.add_argument('--top', type=int, default=10, help="number of slowest modules to list")
+    args = parser.parse_args()
+
+    total, heavy = report("import interface", args.top)
+    print()
+    # For reference: the cost that preload_ml_stack moves off the startup path
+    report("import model", args.top)
+    print()
+
+    failed = False
+    if heavy:
+        print(f"FAIL: importing the GUI loads {', '.join(heavy)}")
+        failed = True
+    if total > args.budget:
+        print(f"FAIL: GUI import took {total:.3f}s (budget {args.budget:.3f}s)")
+        failed = True
+    if not failed:
+        print("OK: GUI startup imports are within budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,54 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from db import (login_user, register_user, save_single_prediction, save_recommendation_prediction, get_user_predictions)
-from model import predict_single_stock, predict_all_stocks, STOCKS
+from db import (login_user, register_user, save_single_prediction, save_recommendation_prediction, get_user_predictions,
+                close_writes)
+from universe import load_universe
+from forecast_store import get_forecast, get_return_stats
+from jobs import JobExecutor
+import tracing
+from tracing import span
 import uuid
+import threading
+import time
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg 
 import numpy as np  
-from PIL import Image, ImageTk  
+
+# Ranking options offered in the recommendation window, mapped to risk.RANK_METRICS keys
+RANK_CHOICES = {
+    "Expected Profit": 'profit',
+    "Sharpe Ratio": 'sharpe',
+    "Sortino Ratio": 'sortino',
+    "Lowest Volatility": 'volatility',
+    "Smallest Drawdown": 'max_drawdown',
+    "Lowest VaR (historical)": 'var_historical',
+    "Lowest VaR (normal)": 'var_parametric',
+    "Lowest Beta": 'beta',
+    "Lowest Chance of Loss": 'prob_loss',
+}
+
+# Recommendation modes: separate top picks, or one portfolio split across the universe
+# by a portfolio.OBJECTIVES objective
+MODE_CHOICES = {
+    "Top 3 Picks": None,
+    "Portfolio (Lowest Risk)": 'min_variance',
+    "Portfolio (Best Sharpe)": 'max_sharpe',
+}
+
+# Holdings listed in the portfolio view; the rest are summarised in one line
+PORTFOLIO_ROWS = 15
+
+# The forecasting stack (TensorFlow/Keras, scikit-learn, yfinance) and matplotlib take
+# several seconds to import, so they are loaded after login or on first use instead
+# of before the login window appears.
+def preload_ml_stack():
+    started = time.perf_counter()
+    try:
+        import model
+        import matplotlib.pyplot
+        from matplotlib.backends import backend_tkagg
+        print(f"Loaded forecasting modules in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"Error preloading forecasting modules: {e}")
    
 class StockApp: 
     def __init__(self, root):  
@@ -70,9 +111,23 @@ class StockApp:
         # Initialize user variable
         self.current_user = None
         
+        # Predictions run in background jobs so the window stays responsive
+        self.jobs = JobExecutor(self.root)
+        self.single_job = None
+        self.rec_job = None
+        self.history_job = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Start with login screen
         self.show_login()
     
+    def on_close(self):
+        self.jobs.shutdown()
+        # Close the window first: writing the queued predictions may wait on the database
+        self.root.destroy()
+        close_writes()
+        tracing.write_metrics()
+    
     def clear_frame(self):
         for widget in self.root.winfo_children():
             widget.destroy()
@@ -140,6 +195,11 @@ class StockApp:
         
         return button_frame
     
+    @staticmethod
+    def format_rupees(value):
+        """Format a signed rupee amount as ₹1,234.56 / -₹1,234.56"""
+        return f"₹{value:,.2f}" if value >= 0 else f"-₹{abs(value):,.2f}"
+    
     def lighten_color(self, hex_color, factor=0.1):
         """Lighten a hex color by a factor"""
         # Convert hex to RGB
@@ -327,6 +387,7 @@ class StockApp:
         
         if user_id:
             self.current_user = user_id
+            threading.Thread(target=preload_ml_stack, daemon=True).start()
             self.show_dashboard()
         else:
             messagebox.showerror("Error", "Invalid credentials", parent=self.root)
@@ -503,7 +564,7 @@ class StockApp:
         self.stock_var = tk.StringVar()
         stock_dropdown = ttk.Combobox(controls_frame, 
                                      textvariable=self.stock_var, 
-                                     values=STOCKS, 
+                                     values=load_universe(), 
                                      width=20,
                                      font=('Helvetica', 11))
         stock_dropdown.pack(side=tk.LEFT, padx=5, pady=control_padding)
@@ -541,6 +602,20 @@ class StockApp:
                                    fg=self.colors['dark'])
         self.status_label.pack(pady=5)
         
+        # Training progress and cancel button, shown while a prediction job runs
+        self.progress_frame = tk.Frame(status_frame, bg='white')
+        self.progress_bar = ttk.Progressbar(self.progress_frame, length=300, mode='determinate', maximum=1.0)
+        self.progress_bar.pack(side=tk.LEFT, padx=5)
+        tk.Button(self.progress_frame, 
+                 text="Cancel",
+                 font=('Helvetica', 10),
+                 bg=self.colors['warning'],
+                 fg='white',
+                 bd=0,
+                 padx=10,
+                 cursor="hand2",
+                 command=self.cancel_single_prediction).pack(side=tk.LEFT, padx=5)
+        
         # Graph container
         self.graph_frame = tk.Frame(graph_panel, bg='white')
         self.graph_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
@@ -556,19 +631,80 @@ class StockApp:
             messagebox.showerror("Error", "Please select a stock", parent=self.root)
             return
         
+        # Only one single-stock job at a time; a new request replaces the running one
+        if self.single_job is not None:
+            self.single_job.cancel()
+        
         self.status_label.config(text=f"Generating prediction for {stock}...", fg=self.colors['dark'])
-        self.root.update()
+        self.progress_bar.config(mode='indeterminate')
+        self.progress_bar.start(15)
+        self.progress_frame.pack(pady=(0, 5))
+        
+        job = self.jobs.submit(
+            self.compute_single_prediction, stock,
+            name=f"predict {stock}",
+            on_done=lambda result: self.finish_single_prediction(job, stock, *result),
+            on_error=lambda e: self.fail_single_prediction(job, stock, e),
+            on_progress=lambda fraction, message: self.update_single_progress(job, fraction, message),
+            on_cancel=lambda: self.end_single_job(job, f"Prediction for {stock} cancelled")
+        )
+        self.single_job = job
+    
+    @staticmethod
+    def compute_single_prediction(stock, report, cancel_event):
+        """Runs on a worker thread, so it must not touch any widgets"""
+        from model import INTERACTIVE_TRAINING, TrainingProgress
+        # Served from the precomputed forecast store; computed on demand (within a time budget) if missing
+        with span('forecast', stock):
+            return get_forecast(stock, callbacks=[TrainingProgress(report, cancel_event)],
+                                training=INTERACTIVE_TRAINING)
+    
+    def cancel_single_prediction(self):
+        if self.single_job is not None:
+            self.single_job.cancel()
+            self.status_label.config(text="Cancelling prediction...", fg=self.colors['dark'])
+    
+    def update_single_progress(self, job, fraction, message):
+        if job is not self.single_job or not self.progress_bar.winfo_exists():
+            return
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate', value=fraction)
+        if message:
+            self.status_label.config(text=message, fg=self.colors['dark'])
+    
+    def end_single_job(self, job, message=None, color=None):
+        """Hide the progress widgets when the current job ends; False if superseded or the screen is gone"""
+        if job is not self.single_job:
+            return False
+        self.single_job = None
+        if not self.status_label.winfo_exists():
+            return False
+        self.progress_bar.stop()
+        self.progress_frame.pack_forget()
+        if message:
+            self.status_label.config(text=message, fg=color or self.colors['dark'])
+        return True
+    
+    def fail_single_prediction(self, job, stock, error):
+        print(f"Prediction job failed for {stock}: {error}")
+        self.end_single_job(job, f"Failed to get prediction for {stock}", self.colors['warning'])
+    
+    def finish_single_prediction(self, job, stock, prediction, actual, band=None):
+        if not self.end_single_job(job):
+            return
         
-        prediction, actual = predict_single_stock(stock)
         if prediction is None:
             self.status_label.config(text=f"Failed to get prediction for {stock}", fg=self.colors['warning'])
             return
         
-        # Ensure prediction and actual are lists of numbers
+        # Ensure prediction and actual are lists of numbers; actual is a PriceSeries carrying its trading dates
         try:
-            prediction = [float(np.array(p).item()) for p in prediction]
-            actual = [float(np.array(a).item()) for a in actual] if actual is not None and len(actual) > 0 else []
-        except (ValueError, TypeError) as e:
+            prediction = np.asarray(prediction, dtype=np.float64).ravel().tolist()
+            actual_days = actual.index if actual is not None and len(actual) > 0 else []
+            actual = actual.values.astype(np.float64).tolist() if len(actual_days) else []
+            lower, upper = (np.asarray(band['lower'], dtype=np.float64), np.asarray(band['upper'], dtype=np.float64)) \
+                if band else (None, None)
+        except (ValueError, TypeError, AttributeError) as e:
             print(f"Error converting data to floats: {e}")
             self.status_label.config(text=f"Invalid data format for {stock}", fg=self.colors['warning'])
             return
@@ -584,15 +720,19 @@ class StockApp:
         
         # Save to database
         try:
-            save_single_prediction(
-                user_id=self.current_user,
-                stock_name=stock.replace('.NS', ''),
-                time_period=10,
-                predicted_profit=float(profit) if profit is not None else 0
-            )
+            with span('db_save', stock):
+                save_single_prediction(
+                    user_id=self.current_user,
+                    stock_name=stock.replace('.NS', ''),
+                    time_period=10,
+                    predicted_profit=float(profit) if profit is not None else 0
+                )
         except Exception as e:
             print(f"Error saving prediction: {e}")
         
+        # Timed by hand rather than with span() to keep the plotting code at its current depth
+        render_started = time.perf_counter()
+        
         # Clear existing graph
         for widget in self.graph_frame.winfo_children():
             widget.destroy()
@@ -600,8 +740,10 @@ class StockApp:
         # Create dates for x-axis
         today = datetime.now()
         if actual:
-            past_dates = [(today - timedelta(days=len(actual)-i)).strftime('%d-%b') for i in range(len(actual))]
-            future_dates = [(today + timedelta(days=i+1)).strftime('%d-%b') for i in range(len(prediction))]
+            # Real trading dates for the closes, then the business days after the last one
+            future_days = np.busday_offset(actual_days[-1], np.arange(1, len(prediction) + 1), roll='forward')
+            past_dates = [day.item().strftime('%d-%b') for day in actual_days]
+            future_dates = [day.item().strftime('%d-%b') for day in future_days]
             all_dates = past_dates + future_dates
             combined_data = actual + prediction[1:]
         else:
@@ -611,6 +753,8 @@ class StockApp:
             combined_data = prediction
         
         # Create figure and plot data with improved styling
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         plt.style.use('ggplot')
         fig, ax = plt.subplots(figsize=(10, 5))
         fig.patch.set_facecolor('white')
@@ -631,6 +775,11 @@ class StockApp:
                        color=self.colors['accent'], markersize=8, 
                        markerfacecolor='white', label='Predicted Price')
                 
+                # Monte Carlo dropout band; it starts at the last actual price like the forecast
+                if lower is not None:
+                    ax.fill_between(x_combined[x_pred_start:x_pred_end], lower[:len(y_pred)], upper[:len(y_pred)],
+                                    color=self.colors['accent'], alpha=0.2, linewidth=0, label='Likely Range (90%)')
+                
                 # Add price labels for actual data
                 for i, price in enumerate(actual):
                     ax.annotate(f'₹{price:.2f}', 
@@ -678,6 +827,9 @@ class StockApp:
             ax.plot(x_pred, prediction, marker='o', linewidth=2.5, 
                    color=self.colors['accent'], markersize=8, 
                    markerfacecolor='white', label='Predicted Price')
+            if lower is not None:
+                ax.fill_between(x_pred, lower[:len(x_pred)], upper[:len(x_pred)],
+                                color=self.colors['accent'], alpha=0.2, linewidth=0, label='Likely Range (90%)')
             
             # Add price labels for predictions
             for i, price in enumerate(prediction):
@@ -726,6 +878,7 @@ class StockApp:
         canvas = FigureCanvasTkAgg(fig, master=self.graph_frame)
         canvas.draw()
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        tracing.observe('chart_render', time.perf_counter() - render_started, stock)
         
         # Set status with profit info
         profit_str = f"Predicted Profit: {'₹' + format(profit, '.2f') if profit > 0 else '-₹' + format(abs(profit), '.2f')}"
@@ -740,7 +893,7 @@ class StockApp:
     def show_recommendation_window(self):
         self.rec_window = tk.Toplevel(self.root)
         self.rec_window.title("Stock Recommendations")
-        self.rec_window.geometry("600x650")
+        self.rec_window.geometry("600x750")
         self.rec_window.configure(bg=self.colors['background'])
         self.rec_window.resizable(False, False)
         
@@ -827,11 +980,47 @@ class StockApp:
                 bg='white',
                 fg=self.colors['dark']).pack(side=tk.LEFT)
         
+        # Ranking metric
+        rank_frame = tk.Frame(params_frame, bg='white')
+        rank_frame.pack(fill=tk.X, padx=40, pady=10)
+        
+        tk.Label(rank_frame, 
+                text="Rank By:",
+                font=('Helvetica', 12),
+                bg='white',
+                fg=self.colors['dark']).pack(side=tk.LEFT, padx=5)
+        
+        self.rank_var = tk.StringVar(value=next(iter(RANK_CHOICES)))
+        ttk.Combobox(rank_frame,
+                     textvariable=self.rank_var,
+                     values=list(RANK_CHOICES),
+                     state='readonly',
+                     width=22,
+                     font=('Helvetica', 11)).pack(side=tk.LEFT, padx=(20, 5))
+        
+        # Picks or portfolio allocation
+        mode_frame = tk.Frame(params_frame, bg='white')
+        mode_frame.pack(fill=tk.X, padx=40, pady=10)
+        
+        tk.Label(mode_frame, 
+                text="Mode:",
+                font=('Helvetica', 12),
+                bg='white',
+                fg=self.colors['dark']).pack(side=tk.LEFT, padx=5)
+        
+        self.mode_var = tk.StringVar(value=next(iter(MODE_CHOICES)))
+        ttk.Combobox(mode_frame,
+                     textvariable=self.mode_var,
+                     values=list(MODE_CHOICES),
+                     state='readonly',
+                     width=22,
+                     font=('Helvetica', 11)).pack(side=tk.LEFT, padx=(20, 5))
+        
         # Generate button
         button_frame = tk.Frame(params_frame, bg='white')
         button_frame.pack(pady=20)
         
-        generate_btn = tk.Button(button_frame, 
+        self.generate_btn = generate_btn = tk.Button(button_frame, 
                                 text="Generate Recommendations",
                                 font=('Helvetica', 13, 'bold'),
                                 bg=self.colors['accent'],
@@ -843,6 +1032,9 @@ class StockApp:
                                 command=self.generate_recommendations)
         generate_btn.pack()
         
+        # Shown while recommendations are computed in the background
+        self.rec_progress = ttk.Progressbar(params_frame, length=300, mode='indeterminate')
+        
         # Results section
         results_frame = tk.Frame(content_frame, 
                                bg='white',
@@ -889,7 +1081,6 @@ class StockApp:
         self.rec_results.config(state=tk.NORMAL)
         self.rec_results.delete(1.0, tk.END)
         self.rec_results.insert(tk.END, "Generating recommendations, please wait...")
-        self.rec_results.update()
         
         try:
             amount = float(self.amount_entry.get())
@@ -902,22 +1093,116 @@ class StockApp:
             self.rec_results.config(state=tk.DISABLED)
             return
         
-        recommendations = predict_all_stocks(amount, days)
+        self.rec_results.config(state=tk.DISABLED)
+        rank_by = RANK_CHOICES.get(self.rank_var.get(), 'profit')
+        objective = MODE_CHOICES.get(self.mode_var.get())
+        if self.rec_job is not None:
+            self.rec_job.cancel()
+        self.rec_progress.pack(pady=(0, 10))
+        self.rec_progress.start(15)
+        self.generate_btn.config(text="Cancel", bg=self.colors['warning'], command=self.cancel_recommendations)
+        
+        if objective is not None:
+            job = self.jobs.submit(
+                self.compute_portfolio, amount, objective,
+                name="portfolio",
+                on_done=lambda result: self.finish_portfolio(job, amount, days, result),
+                on_error=lambda e: self.fail_recommendations(job, e),
+                on_cancel=lambda: self.end_rec_job(job, "Portfolio request cancelled.")
+            )
+            self.rec_job = job
+            return
+        
+        job = self.jobs.submit(
+            self.compute_recommendations, amount, days, rank_by,
+            name="recommendations",
+            on_done=lambda recommendations: self.finish_recommendations(job, amount, days, recommendations, rank_by),
+            on_error=lambda e: self.fail_recommendations(job, e),
+            on_cancel=lambda: self.end_rec_job(job, "Recommendation request cancelled.")
+        )
+        self.rec_job = job
+    
+    @staticmethod
+    def compute_recommendations(amount, days, rank_by, report, cancel_event):
+        """Runs on a worker thread, so it must not touch any widgets"""
+        from model import predict_all_stocks
+        # Seeded per day so repeated clicks give the same ranking
+        seed = int(datetime.now().strftime('%Y%m%d'))
+        # The configured universe is streamed in chunks; only the top 3 are kept
+        return predict_all_stocks(amount, days, tickers=load_universe(), top_k=3,
+                                  stats_source=get_return_stats, seed=seed, rank_by=rank_by)
+    
+    @staticmethod
+    def compute_portfolio(amount, objective, report, cancel_event):
+        """Runs on a worker thread, so it must not touch any widgets"""
+        from portfolio import optimize_portfolio
+        return optimize_portfolio(amount, objective, tickers=load_universe())
+    
+    def insert_risk_metrics(self, stock, amount):
+        def fmt(key, pattern, scale=1):
+            value = stock.get(key)
+            return pattern.format(value * scale) if value is not None else "n/a"
+        
+        var_rupees = self.format_rupees(stock['var_historical'] * amount) if stock.get('var_historical') is not None else "n/a"
+        rows = [
+            ("Volatility (annual)", fmt('volatility', "{:.1f}%", 100)),
+            ("Max Drawdown", fmt('max_drawdown', "{:.1f}%", 100)),
+            ("Sharpe / Sortino", f"{fmt('sharpe', '{:.2f}')} / {fmt('sortino', '{:.2f}')}"),
+            ("1-day VaR 95% (hist / normal)", f"{fmt('var_historical', '{:.2f}%', 100)} / "
+                                              f"{fmt('var_parametric', '{:.2f}%', 100)} ({var_rupees})"),
+            ("Beta vs NIFTY 50", fmt('beta', "{:.2f}")),
+        ]
+        for label, value in rows:
+            self.rec_results.insert(tk.END, f"   • {label}: ", "label")
+            self.rec_results.insert(tk.END, f"{value}\n", "value")
+    
+    def cancel_recommendations(self):
+        if self.rec_job is not None:
+            self.rec_job.cancel()
+    
+    def end_rec_job(self, job, message=None):
+        """Restore the generate button when the current job ends; False if superseded or the window is gone"""
+        if job is not self.rec_job:
+            return False
+        self.rec_job = None
+        if not self.rec_window.winfo_exists():
+            return False
+        self.rec_progress.stop()
+        self.rec_progress.pack_forget()
+        self.generate_btn.config(text="Generate Recommendations", bg=self.colors['accent'],
+                                 command=self.generate_recommendations)
+        if message:
+            self.rec_results.config(state=tk.NORMAL)
+            self.rec_results.delete(1.0, tk.END)
+            self.rec_results.insert(tk.END, message)
+            self.rec_results.config(state=tk.DISABLED)
+        return True
+    
+    def fail_recommendations(self, job, error):
+        print(f"Recommendation job failed: {error}")
+        self.end_rec_job(job, "⚠️ No recommendations could be generated. Please try again later.")
+    
+    def finish_recommendations(self, job, amount, days, recommendations, rank_by='profit'):
+        if not self.end_rec_job(job):
+            return
+        
+        self.rec_results.config(state=tk.NORMAL)
         if not recommendations:
             self.rec_results.delete(1.0, tk.END)
             self.rec_results.insert(tk.END, "⚠️ No recommendations could be generated. Please try again later.")
             self.rec_results.config(state=tk.DISABLED)
             return
         
-        best = recommendations[0]
+        # Saves are queued and written in one batch in the background, so every pick is kept
         try:
-            save_recommendation_prediction(
-                user_id=self.current_user,
-                stock_name=best['stock'],
-                investment_amount=float(amount),
-                time_period=int(days),
-                predicted_profit=float(best['profit'])
-            )
+            for stock in recommendations:
+                save_recommendation_prediction(
+                    user_id=self.current_user,
+                    stock_name=stock['stock'],
+                    investment_amount=float(amount),
+                    time_period=int(days),
+                    predicted_profit=float(stock['profit'])
+                )
         except Exception as e:
             print(f"Error saving recommendation: {e}")
         
@@ -932,7 +1217,11 @@ class StockApp:
         self.rec_results.insert(tk.END, f"₹{amount:,.2f}\n", "value")
         
         self.rec_results.insert(tk.END, f"Investment Period: ", "label")
-        self.rec_results.insert(tk.END, f"{days} days\n\n", "value")
+        self.rec_results.insert(tk.END, f"{days} days\n", "value")
+        
+        rank_label = next((label for label, metric in RANK_CHOICES.items() if metric == rank_by), rank_by)
+        self.rec_results.insert(tk.END, f"Ranked By: ", "label")
+        self.rec_results.insert(tk.END, f"{rank_label}\n\n", "value")
         
         # Add recommendations with improved formatting
         for i, stock in enumerate(recommendations[:3], 1):
@@ -953,9 +1242,19 @@ class StockApp:
             self.rec_results.insert(tk.END, f"   • Expected Profit: ", "label")
             
             if stock['profit'] > 0:
-                self.rec_results.insert(tk.END, f"₹{stock['profit']:,.2f} (+{profit_percent:.1f}%)\n\n", profit_color)
+                self.rec_results.insert(tk.END, f"₹{stock['profit']:,.2f} (+{profit_percent:.1f}%)\n", profit_color)
             else:
-                self.rec_results.insert(tk.END, f"-₹{abs(stock['profit']):,.2f} ({profit_percent:.1f}%)\n\n", profit_color)
+                self.rec_results.insert(tk.END, f"-₹{abs(stock['profit']):,.2f} ({profit_percent:.1f}%)\n", profit_color)
+            
+            self.rec_results.insert(tk.END, f"   • Likely Range (5%-95%): ", "label")
+            self.rec_results.insert(tk.END, f"{self.format_rupees(stock['profit_p5'])} to {self.format_rupees(stock['profit_p95'])}\n", "value")
+            
+            self.rec_results.insert(tk.END, f"   • Chance of Loss: ", "label")
+            self.rec_results.insert(tk.END, f"{stock['prob_loss']*100:.1f}%\n", "value")
+            
+            # Risk metrics; any that could not be computed are shown as n/a
+            self.insert_risk_metrics(stock, amount)
+            self.rec_results.insert(tk.END, "\n")
         
         # Text tags for styling
         self.rec_results.tag_configure("header", font=('Helvetica', 14, 'bold'), foreground=self.colors['primary'])
@@ -970,6 +1269,72 @@ class StockApp:
         # Disable editing
         self.rec_results.config(state=tk.DISABLED)
 
+    def finish_portfolio(self, job, amount, days, result):
+        if not self.end_rec_job(job):
+            return
+        
+        self.rec_results.config(state=tk.NORMAL)
+        self.rec_results.delete(1.0, tk.END)
+        if not result or not result['allocations']:
+            self.rec_results.insert(tk.END, "⚠️ No portfolio could be built. Please try again later.")
+            self.rec_results.config(state=tk.DISABLED)
+            return
+        
+        # Expected returns are annual; the period is in trading days, as for the picks
+        years = days / 252
+        allocations = result['allocations']
+        try:
+            for holding in allocations:
+                save_recommendation_prediction(
+                    user_id=self.current_user,
+                    stock_name=holding['stock'],
+                    investment_amount=float(holding['amount']),
+                    time_period=int(days),
+                    predicted_profit=float(holding['amount'] * holding['expected_return'] * years)
+                )
+        except Exception as e:
+            print(f"Error saving portfolio allocation: {e}")
+        
+        mode_label = next((label for label, objective in MODE_CHOICES.items()
+                           if objective == result['objective']), result['objective'])
+        self.rec_results.insert(tk.END, f"📊 {mode_label}\n", "header")
+        self.rec_results.insert(tk.END, "═══════════════════════════════\n\n", "divider")
+        
+        profit = amount * result['expected_return'] * years
+        sharpe = f"{result['sharpe']:.2f}" if result['sharpe'] is not None else "n/a"
+        rows = [
+            ("Investment Amount", f"₹{amount:,.2f}"),
+            ("Investment Period", f"{days} days"),
+            ("Stocks Held", f"{len(allocations)} (max {result['max_weight']*100:.0f}% each)"),
+            ("Expected Profit", self.format_rupees(profit)),
+            ("Volatility (annual)", f"{result['volatility']*100:.1f}%"),
+            ("Sharpe Ratio", sharpe),
+        ]
+        for label, value in rows:
+            self.rec_results.insert(tk.END, f"{label}: ", "label")
+            self.rec_results.insert(tk.END, f"{value}\n", "value")
+        self.rec_results.insert(tk.END, "\n")
+        
+        for i, holding in enumerate(allocations[:PORTFOLIO_ROWS], 1):
+            self.rec_results.insert(tk.END, f"#{i} ", "rank")
+            self.rec_results.insert(tk.END, f"{holding['stock']}", "stock_name")
+            self.rec_results.insert(tk.END, f"  {holding['weight']*100:.1f}%\n", "value")
+            self.rec_results.insert(tk.END, f"   • Allocation: ", "label")
+            self.rec_results.insert(tk.END, f"₹{holding['amount']:,.2f}", "value")
+            self.rec_results.insert(tk.END, f" ({holding['shares']} shares at ₹{holding['price']:,.2f})\n", "label")
+        rest = allocations[PORTFOLIO_ROWS:]
+        if rest:
+            self.rec_results.insert(tk.END, f"\n…and {len(rest)} more holdings totalling ", "label")
+            self.rec_results.insert(tk.END, f"₹{sum(h['amount'] for h in rest):,.2f}\n", "value")
+        
+        self.rec_results.tag_configure("header", font=('Helvetica', 14, 'bold'), foreground=self.colors['primary'])
+        self.rec_results.tag_configure("divider", foreground=self.colors['primary'])
+        self.rec_results.tag_configure("label", font=('Helvetica', 11), foreground=self.colors['dark'])
+        self.rec_results.tag_configure("value", font=('Helvetica', 11, 'bold'))
+        self.rec_results.tag_configure("rank", font=('Helvetica', 12, 'bold'), foreground=self.colors['secondary'])
+        self.rec_results.tag_configure("stock_name", font=('Helvetica', 13, 'bold'), foreground=self.colors['primary'])
+        self.rec_results.config(state=tk.DISABLED)
+
     # Prediction History
     def show_history(self):
         self.clear_frame()
@@ -988,8 +1353,33 @@ class StockApp:
                 bg=self.colors['background'],
                 fg=self.colors['primary']).pack(side=tk.LEFT)
         
-        # Get user predictions
-        history = get_user_predictions(self.current_user)
+        loading_label = tk.Label(main_frame,
+                                 text="Loading prediction history...",
+                                 font=('Helvetica', 12),
+                                 bg=self.colors['background'],
+                                 fg=self.colors['dark'])
+        loading_label.pack(pady=30)
+        
+        # Query in a background job so a slow or unreachable database can't freeze the window
+        job = self.jobs.submit(
+            self.fetch_history, self.current_user,
+            name="history",
+            on_done=lambda history: self.finish_history(job, main_frame, loading_label, history),
+            on_error=lambda e: self.finish_history(job, main_frame, loading_label, [])
+        )
+        self.history_job = job
+    
+    @staticmethod
+    def fetch_history(user_id, report, cancel_event):
+        """Runs on a worker thread, so it must not touch any widgets"""
+        return get_user_predictions(user_id)
+    
+    def finish_history(self, job, main_frame, loading_label, history):
+        # Superseded by a newer request, or the user has left the history screen
+        if job is not self.history_job or not main_frame.winfo_exists():
+            return
+        self.history_job = None
+        loading_label.destroy()
         
         # Create table container
         table_frame = tk.Frame(main_frame, 
@@ -1116,6 +1506,7 @@ class StockApp:
                 fg=self.colors['dark']).pack(side=tk.LEFT, padx=5)
 
 if __name__ == "__main__":
+    tracing.start_from_env()
     root = tk.Tk()
     app = StockApp(root)
     root.mainloop()
@@ -0,0 +1,115 @@
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """Handle for a background job; cancellation is cooperative via cancel_event"""
+
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        # Jobs that haven't started yet are dropped; running ones see the event
+        if self.future is not None:
+            self.future.cancel()
+
+
+class JobExecutor:
+    """Runs work off the Tk main thread and hands results back through root.after() polling.
+
+    Job functions are called as fn(*args, report=..., cancel_event=..., **kwargs), where
+    report(fraction, message) publishes progress. All callbacks run on the Tk main thread,
+    so they may touch widgets directly.
+    """
+    POLL_MS = 100
+
+    def __init__(self, root, max_workers=2):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stockapp-job')
+        self._events = queue.Queue()
+        self._callbacks = {}
+        self._ids = itertools.count(1)
+        self._polling = False
+
+    def submit(self, fn, *args, name=None, on_done=None, on_error=None, on_progress=None,
+               on_cancel=None, **kwargs):
+        job = Job(next(self._ids), name or getattr(fn, '__name__', 'job'))
+        self._callbacks[job.id] = (job, on_done, on_error, on_progress, on_cancel)
+
+        def report(fraction, message=None):
+            self._events.put((job.id, 'progress', (fraction, message)))
+
+        def run():
+            if job.cancelled:
+                self._events.put((job.id, 'cancelled', None))
+                return
+            try:
+                result = fn(*args, report=report, cancel_event=job.cancel_event, **kwargs)
+            except Exception as e:
+                self._events.put((job.id, 'cancelled' if job.cancelled else 'error', e))
+            else:
+                self._events.put((job.id, 'cancelled' if job.cancelled else 'done', result))
+
+        def on_future_done(future):
+            # run() never executes for a job cancelled while still queued
+            if future.cancelled():
+                self._events.put((job.id, 'cancelled', None))
+
+        job.future = self._pool.submit(run)
+        job.future.add_done_callback(on_future_done)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+        return job
+
+    def active_jobs(self):
+        return [entry[0] for entry in self._callbacks.values()]
+
+    def _poll(self):
+        while True:
+            try:
+                job_id, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            entry = self._callbacks.get(job_id)
+            if entry is None:
+                continue
+            job, on_done, on_error, on_progress, on_cancel = entry
+            if kind == 'progress':
+                if on_progress and not job.cancelled:
+                    on_progress(*payload)
+                continue
+
+            del self._callbacks[job_id]
+            try:
+                if kind == 'done' and on_done:
+                    on_done(payload)
+                elif kind == 'error':
+                    if on_error:
+                        on_error(payload)
+                    else:
+                        print(f"Background job {job.name} failed: {payload}")
+                elif kind == 'cancelled' and on_cancel:
+                    on_cancel()
+            except Exception as e:
+                print(f"Error handling result of {job.name}: {e}")
+
+        if self._callbacks:
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        for job in self.active_jobs():
+            job.cancel()
+        self._pool.shutdown(wait=False)
@@ -1,113 +1,659 @@
-import yfinance as yf
+import os
+import time
+import heapq
+import threading
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from datetime import datetime, timedelta
 from sklearn.preprocessing import MinMaxScaler
 from keras.models import Sequential # type: ignore
-from keras.layers import Dense, LSTM # type: ignore
-
-   
-# Initialize scaler  
-scaler = MinMaxScaler(feature_range=(0, 1))  
-  
-# Available stocks (NSE symbols)
-STOCKS = ["TCS.NS", "INFY.NS", "RELIANCE.NS", "HDFCBANK.NS", "ICICIBANK.NS"]  
+from keras.layers import Dense, Dropout, LSTM # type: ignore
+from keras.callbacks import Callback, EarlyStopping # type: ignore
+from price_cache import RETURN_WINDOWS, load_prices, load_price_matrix, load_return_stats
+from price_series import PriceSeries
+from shared_prices import SharedPriceMatrix, attach_worker, worker_series
+import model_registry
+import tracing
+from tracing import span
+from montecarlo import N_PATHS, profit_distribution
+from universe import STOCKS, load_universe
+from risk import INDEX_TICKER, RANK_METRICS, RISK_METRICS, TRADING_DAYS, matrix_risk_metrics, rank_key
+
+
+
+# Model hyperparameters (also used to key checkpoints in the model registry)
+LOOKBACK = 60
+HORIZON = 10
+LSTM_UNITS = 50
+EPOCHS = 10
+BATCH_SIZE = 32
+DROPOUT = 0.2
+
+# Stochastic forward passes (dropout left on) behind each forecast's confidence band,
+# and the percentiles of those passes that bound the band
+MC_SAMPLES = 100
+BAND_PERCENTILES = (5, 95)
+
+# Epochs used when fine-tuning a stored checkpoint on newly arrived windows
+FINE_TUNE_EPOCHS = 3
+
+# Threads TensorFlow may use inside each predict_many worker process
+WORKER_TF_THREADS = 1
+
+# Training defaults: EPOCHS is an upper bound once early stopping is on
+VALIDATION_SPLIT = 0.1
+PATIENCE = 2
+MIN_DELTA = 1e-5
+MIN_VALIDATION_WINDOWS = 20
+
+# Wall-clock training budget (seconds) for forecasts requested from the GUI
+INTERACTIVE_TIME_BUDGET = 20
+
+# Recommendation ranking: tickers scored per batch and results kept by default
+CHUNK_SIZE = 200
+TOP_K = 10
+
+def model_hparams():
+    return {
+        'lookback': LOOKBACK,
+        'horizon': HORIZON,
+        'units': LSTM_UNITS,
+        'epochs': EPOCHS,
+        'batch_size': BATCH_SIZE,
+        'dropout': DROPOUT,
+    }
  
 def fetch_stock_data(ticker, years=2):
+    """Closing prices for the last `years` as a PriceSeries, or None"""
     end_date = datetime.today()
     start_date = end_date - timedelta(days=365*years) 
     try:
-        df = yf.download(ticker, start=start_date, end=end_date, progress=False, auto_adjust=False)
-        if df.empty:
+        # Served from the local price store; only the missing date range is downloaded
+        with span('fetch', ticker):
+            dates, closes = load_prices(ticker, start_date, end_date)
+        if len(closes) == 0:
             print(f"No data returned for {ticker}")
             return None
-        return df[['Close']]
+        return PriceSeries(dates, closes, ticker)
     except Exception as e:
         print(f"Error fetching {ticker}: {e}")
         return None
 
-def prepare_data(data):
-    scaled_data = scaler.fit_transform(data)
-    X, y = [], []
-    for i in range(60, len(scaled_data)-10):
-        X.append(scaled_data[i-60:i, 0])
-        y.append(scaled_data[i:i+10, 0])
-    return np.array(X), np.array(y)
-
-def build_model():
-    model = Sequential([
-        LSTM(50, return_sequences=True, input_shape=(60, 1)),
-        LSTM(50),
-        Dense(10)
-    ])
+def fetch_price_matrix(tickers=None, years=2):
+    """Fetch closes for many tickers at once as an aligned date x ticker DataFrame"""
+    tickers = STOCKS if tickers is None else tickers
+    end_date = datetime.today()
+    start_date = end_date - timedelta(days=365*years)
+    try:
+        with span('fetch_matrix'):
+            matrix = load_price_matrix(tickers, start_date, end_date)
+        if matrix.empty:
+            print("No data returned for the requested tickers")
+            return None
+        return matrix
+    except Exception as e:
+        print(f"Error fetching price matrix: {e}")
+        return None
+
+def fetch_shared_prices(tickers=None, years=2):
+    """Load closes for many tickers once into a SharedPriceMatrix for worker processes, or None.
+
+    Each ticker's series matches what fetch_stock_data(ticker, years) returns. The caller
+    owns the block and must close() it.
+    """
+    matrix = fetch_price_matrix(tickers, years)
+    if matrix is None:
+        return None
+    try:
+        return SharedPriceMatrix.from_frame(matrix)
+    except OSError as e:
+        print(f"Could not create shared price matrix: {e}")
+        return None
+
+def _forecast_shared(ticker):
+    """Worker task: forecast from the shared price matrix, fetching only tickers missing from it.
+
+    Returns (result, error, timings). The timings are this task's stage histograms, so the
+    parent can merge them into its own metrics.
+    """
+    try:
+        result, error = forecast_stock(ticker, data=worker_series(ticker)), None
+    except Exception as e:
+        result, error = None, str(e)
+    return result, error, tracing.drain()
+
+def fetch_return_stats(tickers=None, years=2):
+    """Per-ticker {current_price, avg_return, std_return} from the price store's running statistics.
+
+    Statistics cover the trailing `years` of daily returns (TRADING_DAYS per year) and are
+    kept up to date as bars arrive, so no history is rescanned. Only the windows in
+    RETURN_WINDOWS are kept, so `years` must match one of them.
+    """
+    window = round(TRADING_DAYS * years)
+    if window not in RETURN_WINDOWS:
+        choices = ', '.join(f"{w / TRADING_DAYS:g}" for w in RETURN_WINDOWS)
+        raise ValueError(f"Return statistics are kept for {choices} years, not {years}")
+    tickers = STOCKS if tickers is None else tickers
+    end_date = datetime.today()
+    start_date = end_date - timedelta(days=365*years)
+    try:
+        with span('fetch_stats'):
+            return load_return_stats(tickers, start_date, end_date, window)
+    except Exception as e:
+        print(f"Error fetching return statistics: {e}")
+        return {}
+
+def fetch_risk_metrics(tickers, years=2, index_ticker=INDEX_TICKER):
+    """Per-ticker risk metrics (see risk.risk_metrics) from one batched price matrix.
+
+    The index used for beta is fetched in the same batch. Tickers without prices are omitted.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    matrix = fetch_price_matrix(tickers + [index_ticker], years)
+    if matrix is None:
+        return {}
+    index = matrix.pop(index_ticker) if index_ticker in matrix.columns and index_ticker not in tickers else None
+    if index is not None and index.isna().all():
+        index = None
+    with span('risk_metrics'):
+        return matrix_risk_metrics(matrix[[t for t in tickers if t in matrix.columns]], index)
+
+def _attach_risk(results):
+    """Add risk metrics to results that don't have them yet, in one batch"""
+    missing = [result for result in results if 'volatility' not in result]
+    if not missing:
+        return results
+    try:
+        risk = fetch_risk_metrics([result['ticker'] for result in missing])
+    except Exception as e:
+        print(f"Error computing risk metrics: {e}")
+        return results
+    for result in missing:
+        result.update(risk.get(result['ticker'], dict.fromkeys(RISK_METRICS)))
+    return results
+
+class ForecastContext:
+    """Preprocessing state for one forecasting run.
+
+    Each run owns its scaler, so concurrent predictions (threads or worker
+    processes) never share or refit each other's scaling.
+    """
+    def __init__(self, ticker, lookback=LOOKBACK, horizon=HORIZON, data_scaler=None):
+        self.ticker = ticker
+        self.lookback = lookback
+        self.horizon = horizon
+        self.scaler = data_scaler if data_scaler is not None else MinMaxScaler(feature_range=(0, 1))
+
+    def prepare(self, data, fit=True, dtype=np.float32):
+        with span('prepare_data', self.ticker):
+            return prepare_data(data, self.scaler, fit, self.lookback, self.horizon, dtype)
+
+    def transform(self, values):
+        return self.scaler.transform(values)
+
+    def inverse_transform(self, values):
+        return self.scaler.inverse_transform(values)
+
+def prepare_data(data, data_scaler=None, fit=True, lookback=LOOKBACK, horizon=HORIZON, dtype=np.float32):
+    """Build (X, y) windows as strided views over a single scaled copy of the series.
+
+    X has shape (n, lookback, 1) and y has shape (n, horizon). Both are read-only views,
+    so memory stays proportional to the series length instead of n * lookback.
+    A fresh scaler is used when none is given; pass one in to keep it for inverse scaling.
+    """
+    if data_scaler is None:
+        data_scaler = MinMaxScaler(feature_range=(0, 1))
+    scaled_data = data_scaler.fit_transform(data) if fit else data_scaler.transform(data)
+    series = np.ascontiguousarray(scaled_data[:, 0], dtype=dtype)
+
+    # Window i covers X = series[i-lookback:i] and y = series[i:i+horizon] for
+    # i in range(lookback, len(series) - horizon), matching the original loop
+    n = len(series) - lookback - horizon
+    if n <= 0:
+        return np.empty((0, lookback, 1), dtype=dtype), np.empty((0, horizon), dtype=dtype)
+    windows = sliding_window_view(series, lookback + horizon)[:n]
+    return windows[:, :lookback, np.newaxis], windows[:, lookback:]
+
+def build_model(dropout=DROPOUT):
+    """Two stacked LSTMs with a Dense head; the Dropout layers also drive Monte Carlo dropout bands"""
+    layers = [LSTM(LSTM_UNITS, return_sequences=True, input_shape=(LOOKBACK, 1))]
+    if dropout:
+        layers.append(Dropout(dropout))
+    layers.append(LSTM(LSTM_UNITS))
+    if dropout:
+        layers.append(Dropout(dropout))
+    layers.append(Dense(HORIZON))
+    model = Sequential(layers)
     model.compile(optimizer='adam', loss='mse')
     return model
 
-def predict_single_stock(ticker):
-    data = fetch_stock_data(ticker)
-    if data is None or len(data) < 70:
-        return None, None
+class TrainingCancelled(Exception):
+    pass
+
+class TimeBudget(Callback):
+    """Stops training once `seconds` of wall time have passed since training began"""
+    def __init__(self, seconds):
+        super().__init__()
+        self.seconds = seconds
+        self.started = None
+        self.exhausted = False
+
+    def on_train_begin(self, logs=None):
+        self.started = time.perf_counter()
+        self.exhausted = False
+
+    def on_train_batch_end(self, batch, logs=None):
+        if time.perf_counter() - self.started > self.seconds:
+            self.exhausted = True
+            self.model.stop_training = True
+
+class TrainingConfig:
+    """How a forecaster is fitted: epoch cap, batch size, validation split, early stopping and time budget.
+
+    The last `validation_split` of the windows (the most recent ones) are held out for early
+    stopping on val_loss, then learned in `holdout_epochs` more epochs from the best weights,
+    so the model still sees the newest data. Series too short for MIN_VALIDATION_WINDOWS
+    stop on training loss. `time_budget` (seconds, None for unlimited) bounds wall time
+    regardless of the epoch count.
+    """
+    def __init__(self, epochs=EPOCHS, batch_size=BATCH_SIZE, validation_split=VALIDATION_SPLIT,
+                 patience=PATIENCE, min_delta=MIN_DELTA, time_budget=None, shuffle=True,
+                 holdout_epochs=FINE_TUNE_EPOCHS):
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.validation_split = validation_split
+        self.patience = patience
+        self.min_delta = min_delta
+        self.time_budget = time_budget
+        self.shuffle = shuffle
+        self.holdout_epochs = holdout_epochs
+
+    def datasets(self, X, y):
+        """Chronological train/validation split as batched, prefetching tf.data pipelines"""
+        import tensorflow as tf
+        n_val = int(len(X) * self.validation_split)
+        if n_val < MIN_VALIDATION_WINDOWS:
+            n_val = 0
+        n_train = len(X) - n_val
+        train = tf.data.Dataset.from_tensor_slices((X[:n_train], y[:n_train]))
+        if self.shuffle:
+            train = train.shuffle(n_train, reshuffle_each_iteration=True)
+        train = train.batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+        if not n_val:
+            return train, None
+        val = tf.data.Dataset.from_tensor_slices((X[n_train:], y[n_train:]))
+        return train, val.batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+
+    def fit(self, model, X, y, callbacks=None, epochs=None):
+        """Fit `model` on windows X, y; returns the Keras History.
+
+        history.budget_exhausted is True if the time budget cut training short.
+        """
+        train, val = self.datasets(X, y)
+        monitor = 'val_loss' if val is not None else 'loss'
+        extra = []
+        if self.patience is not None:
+            extra.append(EarlyStopping(monitor=monitor, patience=self.patience, min_delta=self.min_delta,
+                                       restore_best_weights=True))
+        budget = TimeBudget(self.time_budget) if self.time_budget else None
+        if budget is not None:
+            extra.append(budget)
+        # Shuffling happens in the dataset, so Keras is told not to (it would warn otherwise)
+        history = model.fit(train, validation_data=val, epochs=epochs or self.epochs, verbose=0,
+                            callbacks=list(callbacks or []) + extra, shuffle=False)
+        history.budget_exhausted = budget is not None and budget.exhausted
+        if val is not None and self.holdout_epochs:
+            # Learn the held-out windows too: later fine-tunes only add windows past the checkpoint
+            with span('fit_holdout'):
+                model.fit(val, epochs=self.holdout_epochs, verbose=0, callbacks=list(callbacks or []),
+                          shuffle=False)
+        return history
+
+# Interactive requests trade some accuracy for a bounded response time
+INTERACTIVE_TRAINING = TrainingConfig(time_budget=INTERACTIVE_TIME_BUDGET)
+
+class TrainingProgress(Callback):
+    """Reports training progress through report(fraction, message) and aborts when cancel_event is set"""
+    def __init__(self, report=None, cancel_event=None):
+        super().__init__()
+        self.report = report
+        self.cancel_event = cancel_event
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            # Raising (rather than stop_training) keeps a half-trained model out of the registry
+            raise TrainingCancelled("Training cancelled")
+
+    def on_epoch_end(self, epoch, logs=None):
+        epochs = self.params.get('epochs') if self.params else None
+        if self.report and epochs:
+            self.report((epoch + 1) / epochs, f"Training epoch {epoch + 1}/{epochs}")
+
+def _scaler_covers(data_scaler, values, margin=0.1):
+    """True if values stay within the scaler's fitted range (plus a small margin)"""
+    scaled = data_scaler.transform(values)
+    return scaled.min() >= -margin and scaled.max() <= 1 + margin
+
+def train_or_load(context, data, callbacks=None, training=None):
+    """Return a model trained for context.ticker, reusing the model registry where possible.
+
+    The fitted scaler ends up on context.scaler. If a checkpoint already covers the latest
+    bar, it is loaded without training. On a new trading day the newest checkpoint is
+    fine-tuned on the windows that include new bars only. Otherwise a fresh model is
+    trained and stored. `training` is a TrainingConfig (default: TrainingConfig()).
+
+    Checkpoints whose training was cut short by a time budget are marked incomplete.
+    They are good enough for other budgeted (interactive) requests, but callers without
+    a budget retrain from scratch instead of building on them.
+    """
+    training = training or TrainingConfig()
+    ticker = context.ticker
+    hparams = model_hparams()
+    end_date = data.last_date
+    entry = model_registry.latest(ticker, hparams)
+    if entry is not None and not entry.get('complete', True) and not training.time_budget:
+        entry = None
+
+    if entry is not None and entry['end_date'] == end_date:
+        with span('load_checkpoint', ticker):
+            context.scaler = model_registry.load_scaler(entry)
+            return model_registry.load_model(entry, build_model)
+
+    if entry is not None and entry['end_date'] < end_date:
+        stored_scaler = model_registry.load_scaler(entry)
+        if _scaler_covers(stored_scaler, data.column()):
+            context.scaler = stored_scaler
+            with span('load_checkpoint', ticker):
+                model = model_registry.load_model(entry, build_model)
+            X, y = context.prepare(data.column(), fit=False)
+            # Window i targets bars [i+lookback, i+lookback+horizon) and the last bar is never a
+            # target, so the checkpoint, trained on the first `first_new` bars, saw the first
+            # first_new - lookback - horizon windows; the rest are new
+            first_new = len(data) - len(data.since(entry['end_date']))
+            n_new = min(len(X), len(X) - (first_new - context.lookback - context.horizon))
+            if n_new <= 0:
+                # No window has a new target yet; the checkpoint stays at its end date
+                return model
+            with span('fine_tune', ticker):
+                history = training.fit(model, X[-n_new:], y[-n_new:], callbacks, epochs=FINE_TUNE_EPOCHS)
+            complete = entry.get('complete', True) and not history.budget_exhausted
+            with span('save_checkpoint', ticker):
+                model_registry.save(ticker, model, context.scaler, end_date, hparams, complete=complete)
+            return model
+
+    X, y = context.prepare(data.column())
+    with span('fit', ticker):
+        model = build_model()
+        history = training.fit(model, X, y, callbacks)
+    with span('save_checkpoint', ticker):
+        model_registry.save(ticker, model, context.scaler, end_date, hparams,
+                            complete=not history.budget_exhausted)
+    return model
+
+# One sampler network per process. Each forecast's weights are copied into it, so the traced
+# dropout graph is reused rather than retraced for every freshly loaded model.
+_sampler = None
+_sampler_lock = threading.Lock()
+
+def _dropout_sampler():
+    global _sampler
+    if _sampler is None:
+        import tensorflow as tf
+        net = build_model()
+
+        @tf.function(reduce_retracing=True)
+        def passes(window, samples):
+            return net(window, training=False), net(tf.repeat(window, samples, axis=0), training=True)
+        _sampler = net, passes
+    return _sampler
+
+def predict_with_dropout(model, window, samples=MC_SAMPLES):
+    """Point forecast plus `samples` Monte Carlo dropout passes for one scaled (1, LOOKBACK, 1) window.
+
+    The window is tiled into one batch and run with dropout active, so each row comes from
+    a different thinned network. Both passes run as one call of a graph traced once per
+    process, which costs about the same as one model.predict.
+    Returns (point (1, HORIZON), paths (samples, HORIZON)).
+    """
+    import tensorflow as tf
+    with _sampler_lock:
+        net, passes = _dropout_sampler()
+        net.set_weights(model.get_weights())
+        point, paths = passes(tf.constant(window, dtype=tf.float32), tf.constant(samples))
+        return np.asarray(point), np.asarray(paths)
+
+def dropout_band(context, paths, scale_factor, percentiles=BAND_PERCENTILES):
+    """Confidence band from scaled dropout paths.
+
+    Every path is multiplied by `scale_factor`, the factor that anchors the point forecast
+    to the last close, so the band keeps each path's own first-step deviation.
+    Returns {'mean', 'lower', 'upper'} arrays of prices.
+    """
+    paths = context.inverse_transform(paths.reshape(-1, 1)).reshape(len(paths), -1) * scale_factor
+    lower, upper = np.percentile(paths, percentiles, axis=0)
+    return {'mean': paths.mean(axis=0), 'lower': lower, 'upper': upper}
+
+def forecast_stock(ticker, callbacks=None, training=None, samples=MC_SAMPLES, data=None):
+    """Fetch, train and forecast one ticker; raises on failure instead of returning None.
+
+    `callbacks` are passed to Keras fit, e.g. a TrainingProgress for progress and cancellation,
+    and `training` is the TrainingConfig used if a model has to be trained. `data` is the
+    ticker's PriceSeries if the caller already has it; otherwise it is fetched.
+    Returns (prediction, actual, band), where band is dropout_band()'s dict from `samples`
+    dropout passes, or None when samples is 0.
+    """
+    if data is None:
+        data = fetch_stock_data(ticker)
+    if data is None or len(data) < LOOKBACK + HORIZON:
+        raise ValueError(f"Not enough price history for {ticker}")
     
+    context = ForecastContext(ticker)
+    model = train_or_load(context, data, callbacks, training)
+
+    # Get the last 60 days of data for prediction input
+    last_60 = data.column()[-LOOKBACK:]
+    last_60_scaled = context.transform(last_60)
+
+    # Reshape for model input - needs to be (samples, time steps, features)
+    X_test = last_60_scaled.reshape(1, LOOKBACK, 1)
+    with span('predict', ticker):
+        if samples:
+            prediction_scaled, paths = predict_with_dropout(model, X_test, samples)
+        else:
+            prediction_scaled = model.predict(X_test, verbose=0)
+
+    # The prediction shape is (1, 10) - we need to reshape it to (10, 1) for inverse transform
+    prediction_scaled = prediction_scaled.reshape(HORIZON, 1)
+    with span('inverse_scaling', ticker):
+        prediction = context.inverse_transform(prediction_scaled).flatten()
+
+    # Get the actual values for the last 10 days (for comparison), as a view with their dates
+    actual = data[-HORIZON:]
+
+    # Ensure the prediction starts from the same point as the actual last value
+    scale_factor = 1.0
+    if actual is not None and len(actual) > 0:
+        # Calculate the scaling factor to adjust the prediction
+        # This makes the first prediction match the last actual value
+        scale_factor = actual.last / prediction[0]
+        prediction = prediction * scale_factor
+    band = dropout_band(context, paths, scale_factor) if samples else None
+
+    return prediction, actual, band
+
+def predict_single_stock(ticker, callbacks=None, training=None, samples=MC_SAMPLES, data=None):
     try:
-        X, y = prepare_data(data.values)
-        model = build_model()
-        model.fit(X, y, epochs=10, batch_size=32, verbose=0)
-        
-        # Get the last 60 days of data for prediction input
-        last_60 = data[-60:].values
-        last_60_scaled = scaler.transform(last_60)
-        
-        # Reshape for model input - needs to be (samples, time steps, features)
-        X_test = last_60_scaled.reshape(1, 60, 1)
-        prediction_scaled = model.predict(X_test)
-        
-        # The prediction shape is (1, 10) - we need to reshape it to (10, 1) for inverse transform
-        prediction_scaled = prediction_scaled.reshape(10, 1)
-        prediction = scaler.inverse_transform(prediction_scaled).flatten()
-        
-        # Get the actual values for the last 10 days (for comparison)
-        actual = data['Close'].values[-10:] if len(data) >= 70 else None
-        
-        # Ensure the prediction starts from the same point as the actual last value
-        if actual is not None and len(actual) > 0:
-            # Calculate the scaling factor to adjust the prediction
-            # This makes the first prediction match the last actual value
-            scale_factor = actual[-1] / prediction[0]
-            prediction = prediction * scale_factor
-            
-        return prediction, actual
+        return forecast_stock(ticker, callbacks, training, samples, data)
     except Exception as e:
         print(f"Prediction failed for {ticker}: {e}")
-        return None, None
+        return None, None, None
 
-def predict_all_stocks(amount, time_days):
-    results = []
-    for stock in STOCKS:
-        data = fetch_stock_data(stock)
-        if data is None or len(data) < 10:
+def _init_worker(tf_threads, shared_handle=None):
+    """Cap TensorFlow's thread pools so worker processes don't oversubscribe the CPU,
+    and attach to the parent's shared price matrix if there is one"""
+    attach_worker(shared_handle)
+    for var in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ[var] = str(tf_threads)
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(tf_threads)
+    except RuntimeError as e:
+        # Raised if the TensorFlow runtime was already initialised in this process
+        print(f"Could not cap TensorFlow threads: {e}")
+
+def predict_many(tickers, workers=None, tf_threads=WORKER_TF_THREADS):
+    """Forecast several tickers in a process pool, yielding results as each one finishes.
+
+    Yields (ticker, prediction, actual, band, error) tuples. A failing ticker yields its
+    error message instead of aborting the batch. Prices are loaded once into a shared
+    memory block that every worker reads from.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // tf_threads)
+
+    shared = fetch_shared_prices(tickers)
+    try:
+        # Spawn rather than fork: forking a process that has already started TensorFlow's
+        # thread pools can deadlock the children
+        with ProcessPoolExecutor(max_workers=min(workers, len(tickers)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(tf_threads, shared.handle if shared else None)) as pool:
+            futures = {pool.submit(_forecast_shared, ticker): ticker for ticker in tickers}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    result, error, timings = future.result()
+                except Exception as e:
+                    yield ticker, None, None, None, str(e)
+                    continue
+                # Worker stage timings (fit, predict, ...) join the parent's metrics
+                tracing.merge(timings)
+                if error:
+                    yield ticker, None, None, None, error
+                else:
+                    yield (ticker, *result, None)
+    finally:
+        if shared is not None:
+            shared.close()
+
+def return_stats(matrix):
+    """Per-ticker statistics used for recommendations: last price and daily return mean/std"""
+    stats = {}
+    for stock in matrix.columns:
+        prices = PriceSeries.from_pandas(matrix[stock], stock)
+        if len(prices) < 10:
             continue
-        
+        stats[stock] = {
+            'current_price': prices.last,
+            'avg_return': prices.mean_return(),
+            'std_return': prices.std_return(),
+        }
+    return stats
+
+def score_stocks(stats, amount, time_days, n_paths=N_PATHS, seed=None):
+    """Monte Carlo profit distribution for each ticker in `stats`, unsorted"""
+    stats = {stock: s for stock, s in stats.items()
+             if np.isfinite([s['current_price'], s['avg_return'], s['std_return']]).all()}
+    if not stats:
+        return []
+
+    stocks = list(stats)
+    current_prices = np.array([stats[stock]['current_price'] for stock in stocks])
+    distribution = profit_distribution(
+        current_prices,
+        [stats[stock]['avg_return'] for stock in stocks],
+        [stats[stock]['std_return'] for stock in stocks],
+        amount, time_days, n_paths=n_paths, seed=seed
+    )
+
+    results = []
+    for i, stock in enumerate(stocks):
+        p_low, p_mid, p_high = distribution['percentiles'][i]
+        results.append({
+            'ticker': stock,
+            'stock': stock.replace('.NS', ''),
+            'current_price': float(current_prices[i]),
+            'predicted_price': float(distribution['expected_price'][i]),
+            'profit': float(distribution['expected_profit'][i]),
+            'profit_p5': float(p_low),
+            'profit_p50': float(p_mid),
+            'profit_p95': float(p_high),
+            'prob_loss': float(distribution['prob_loss'][i]),
+        })
+    return results
+
+def rank_universe(amount, time_days, tickers=None, top_k=TOP_K, chunk_size=CHUNK_SIZE,
+                  stats_source=None, n_paths=N_PATHS, seed=None, rank_by='profit'):
+    """Stream the universe in chunks, keeping only the top_k results by `rank_by`.
+
+    `rank_by` is expected profit or any metric in risk.RANK_METRICS. Risk metrics are
+    computed per chunk when ranking by one, otherwise only for the results kept.
+    `stats_source(chunk)` returns {ticker: stats}; by default the price store's running
+    return statistics are read. Memory is bounded by chunk_size and top_k, not universe size.
+    Returns (top results sorted best first, tickers that could not be scored).
+    """
+    if rank_by not in RANK_METRICS:
+        raise ValueError(f"Unknown ranking metric {rank_by!r}; choose from {', '.join(RANK_METRICS)}")
+    tickers = load_universe() if tickers is None else list(tickers)
+    heap, failed = [], []
+    order = itertools.count()
+    for chunk_index, start in enumerate(range(0, len(tickers), chunk_size)):
+        chunk = tickers[start:start + chunk_size]
         try:
-            current_price = float(data['Close'].iloc[-1])
-            returns = data['Close'].pct_change().dropna()
-            avg_return = float(returns.mean())
-            std_return = float(returns.std())
-            
-            predicted_return = np.random.normal(avg_return, std_return/2)
-            predicted_price = current_price * (1 + predicted_return)**time_days
-            profit = amount * (predicted_price/current_price - 1)
-            
-            results.append({
-                'stock': stock.replace('.NS', ''),
-                'current_price': current_price,
-                'predicted_price': float(predicted_price),
-                'profit': float(profit)
-            })
+            stats = (stats_source or fetch_return_stats)(chunk)
+            # Seed each chunk separately so results don't depend on which chunks failed
+            chunk_seed = None if seed is None else [seed, chunk_index]
+            results = score_stocks(stats, amount, time_days, n_paths=n_paths, seed=chunk_seed)
+            if rank_by in RISK_METRICS:
+                _attach_risk(results)
         except Exception as e:
-            print(f"Skipping {stock} due to error: {e}")
+            print(f"Skipping {len(chunk)} tickers from {chunk[0]} due to error: {e}")
+            failed.extend(chunk)
             continue
-    
-    return sorted(
-        [r for r in results if r['profit'] is not None], 
-        key=lambda x: x['profit'], 
-        reverse=True
-    )
+
+        scored = {result['ticker'] for result in results}
+        failed.extend(ticker for ticker in chunk if ticker not in scored)
+        for result in results:
+            key = rank_key(result, rank_by)
+            if key is None:
+                continue
+            item = (key, next(order), result)
+            if top_k is None or len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item[0] > heap[0][0]:
+                heapq.heapreplace(heap, item)
+
+    top = [item[2] for item in sorted(heap, key=lambda item: item[0], reverse=True)]
+    return _attach_risk(top), failed
+
+def predict_all_stocks(amount, time_days, stats=None, n_paths=N_PATHS, seed=None, tickers=None,
+                       top_k=None, stats_source=None, rank_by='profit'):
+    """Rank stocks by expected profit from a Monte Carlo simulation of daily returns, or by `rank_by`.
+
+    Pass precomputed `stats` to score exactly those tickers, or let the configured universe
+    (or `tickers`) be streamed in chunks. Use `top_k` to keep only the best results and a
+    `seed` for reproducible results. Tickers that fail are skipped, so partial results are
+    returned. Each result also carries profit percentiles, the probability of a loss and
+    the risk metrics from risk.py.
+    """
+    if stats is not None:
+        results = score_stocks(stats, amount, time_days, n_paths=n_paths, seed=seed)
+        if rank_by in RISK_METRICS:
+            _attach_risk(results)
+        results = [result for result in results if rank_key(result, rank_by) is not None]
+        results.sort(key=lambda result: rank_key(result, rank_by), reverse=True)
+        return _attach_risk(results if top_k is None else results[:top_k])
+
+    top, failed = rank_universe(amount, time_days, tickers, top_k, stats_source=stats_source,
+                                n_paths=n_paths, seed=seed, rank_by=rank_by)
+    if failed:
+        print(f"Could not score {len(failed)} tickers: {', '.join(failed[:10])}{'...' if len(failed) > 10 else ''}")
+    return top
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from datetime import date, datetime
+
+# Directory holding trained checkpoints, one sub-directory per ticker
+REGISTRY_DIR = os.environ.get(
+    "STOCK_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "models")
+)
+
+# Checkpoints kept per ticker and hyperparameter set; older ones are pruned on save
+KEEP_CHECKPOINTS = 3
+
+_lock = threading.Lock()
+
+
+def hparams_key(hparams):
+    """Short stable hash identifying a hyperparameter set"""
+    blob = json.dumps(hparams, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+
+def _ticker_dir(ticker):
+    return os.path.join(REGISTRY_DIR, ticker.replace('/', '_'))
+
+
+def _entries(ticker, hparams):
+    """All checkpoints for a ticker trained with the given hyperparameters (any if None), newest first"""
+    directory = _ticker_dir(ticker)
+    if not os.path.isdir(directory):
+        return []
+    key = hparams_key(hparams) if hparams is not None else ''
+    entries = []
+    for name in os.listdir(directory):
+        if not (name.startswith(key) and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping unreadable checkpoint {name}: {e}")
+            continue
+        meta['end_date'] = date.fromisoformat(meta['end_date'])
+        meta['weights_path'] = os.path.join(directory, meta['weights_file'])
+        meta['scaler_path'] = os.path.join(directory, meta['scaler_file'])
+        meta['npz_path'] = os.path.join(directory, meta['npz_file']) if meta.get('npz_file') else None
+        meta['meta_path'] = os.path.join(directory, name)
+        entries.append(meta)
+    return sorted(entries, key=lambda m: m['end_date'], reverse=True)
+
+
+def latest(ticker, hparams=None):
+    """Return metadata for the newest checkpoint matching the hyperparameters (any if None), or None"""
+    with _lock:
+        entries = _entries(ticker, hparams)
+    return entries[0] if entries else None
+
+
+def load_scaler(entry):
+    with open(entry['scaler_path'], 'rb') as f:
+        return pickle.load(f)
+
+
+def load_model(entry, build):
+    """Build a fresh model with `build` and load the checkpoint weights into it"""
+    model = build()
+    model.load_weights(entry['weights_path'])
+    return model
+
+
+def save(ticker, model, scaler, end_date, hparams, export=True, complete=True):
+    """Store weights, scaler and metadata keyed by ticker, data end date and hyperparameters.
+
+    With `export`, the weights and scaler are also written as a .npz for numpy_runtime,
+    so the checkpoint can be served without TensorFlow. `complete` is False for a model
+    whose training was cut short by a time budget.
+    """
+    directory = _ticker_dir(ticker)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{hparams_key(hparams)}_{end_date:%Y%m%d}"
+    meta = {
+        'ticker': ticker,
+        'end_date': end_date.isoformat(),
+        'hparams': hparams,
+        'saved_at': datetime.now().isoformat(timespec='seconds'),
+        'weights_file': f"{name}.weights.h5",
+        'scaler_file': f"{name}.scaler.pkl",
+        'npz_file': f"{name}.npz" if export else None,
+        'complete': complete,
+    }
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+    with _lock:
+        weights_path = os.path.join(directory, meta['weights_file'])
+        # Keras picks the file format from the extension, so the temp name keeps it
+        tmp_weights = weights_path[:-len('.weights.h5')] + suffix + '.weights.h5'
+        model.save_weights(tmp_weights)
+        os.replace(tmp_weights, weights_path)
+
+        scaler_path = os.path.join(directory, meta['scaler_file'])
+        with open(scaler_path + suffix, 'wb') as f:
+            pickle.dump(scaler, f)
+        os.replace(scaler_path + suffix, scaler_path)
+
+        if export:
+            from numpy_runtime import export_npz
+            npz_path = os.path.join(directory, meta['npz_file'])
+            # np.savez appends .npz to names lacking it, so the temp name keeps the extension
+            tmp_npz = npz_path[:-len('.npz')] + suffix + '.npz'
+            export_npz(model, scaler, tmp_npz)
+            os.replace(tmp_npz, npz_path)
+
+        # The metadata file is written last so a checkpoint only becomes visible once complete
+        meta_path = os.path.join(directory, f"{name}.json")
+        with open(meta_path + suffix, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(meta_path + suffix, meta_path)
+
+        for old in _entries(ticker, hparams)[KEEP_CHECKPOINTS:]:
+            for path in (old['weights_path'], old['scaler_path'], old['npz_path'], old['meta_path']):
+                if path is None:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,60 @@
+import numpy as np
+
+# Simulated return paths per ticker
+N_PATHS = 5000
+
+# Percentiles of the profit distribution reported for each ticker
+PERCENTILES = (5, 50, 95)
+
+# Upper bound on random draws (paths x tickers x days) held in memory at once
+MAX_BATCH_ELEMENTS = 20_000_000
+
+
+def lognormal_params(avg_returns, std_returns):
+    """Daily log-return mean and std matching the given arithmetic daily return mean and std"""
+    mu = np.asarray(avg_returns, dtype=np.float64)
+    sigma = np.asarray(std_returns, dtype=np.float64)
+    var_log = np.log1p(sigma ** 2 / (1 + mu) ** 2)
+    return np.log1p(mu) - var_log / 2, np.sqrt(var_log)
+
+
+def simulate_growth(avg_returns, std_returns, days, n_paths=N_PATHS, seed=None, full_paths=False):
+    """Simulate compounded growth factors over `days` for every ticker.
+
+    Daily returns are lognormal with the given arithmetic mean and std. With full_paths,
+    every day of every path is drawn as one (n_paths, n_tickers, days) array (batched over
+    tickers only beyond MAX_BATCH_ELEMENTS). Otherwise, the sum of the iid daily log returns
+    is drawn directly. That gives the same terminal distribution with `days` times fewer draws.
+    Returns an (n_paths, n_tickers) array.
+    """
+    m, s = lognormal_params(avg_returns, std_returns)
+    rng = np.random.default_rng(seed)
+
+    if not full_paths:
+        draws = rng.standard_normal((n_paths, len(m)))
+        return np.exp(days * m + np.sqrt(days) * s * draws)
+
+    log_growth = np.empty((n_paths, len(m)))
+    step = max(1, MAX_BATCH_ELEMENTS // max(1, n_paths * days))
+    for lo in range(0, len(m), step):
+        hi = min(lo + step, len(m))
+        draws = rng.standard_normal((n_paths, hi - lo, days), dtype=np.float32)
+        log_growth[:, lo:hi] = draws.sum(axis=2, dtype=np.float64) * s[lo:hi] + days * m[lo:hi]
+    return np.exp(log_growth)
+
+
+def profit_distribution(current_prices, avg_returns, std_returns, amount, days,
+                        n_paths=N_PATHS, seed=None, percentiles=PERCENTILES, full_paths=False):
+    """Summarise simulated profits on `amount` invested in each ticker for `days`.
+
+    Returns a dict of per-ticker arrays: expected_profit, expected_price, prob_loss and
+    percentiles (shape (n_tickers, len(percentiles))).
+    """
+    growth = simulate_growth(avg_returns, std_returns, days, n_paths, seed, full_paths)
+    profits = amount * (growth - 1)
+    return {
+        'expected_profit': profits.mean(axis=0),
+        'expected_price': np.asarray(current_prices, dtype=np.float64) * growth.mean(axis=0),
+        'percentiles': np.percentile(profits, percentiles, axis=0).T,
+        'prob_loss': (profits < 0).mean(axis=0),
+    }
@@ -0,0 +1,187 @@
+"""TensorFlow-free inference for forecasters trained with model.build_model().
+
+A trained model is exported with export_npz() to a compact .npz holding the LSTM and
+Dense weights, the input window length and the fitted MinMaxScaler parameters.
+NumpyForecaster then reproduces predict_single_stock's forecast with a pure NumPy forward
+pass. Several forecasters can be stacked to run one vectorized pass over many tickers.
+forecast_store falls back to this runtime when TensorFlow is not installed.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import model_registry
+from price_cache import load_prices
+from price_series import PriceSeries
+
+
+def export_npz(keras_model, data_scaler, path):
+    """Write the weights of a trained LSTM/Dense stack and its scaler to `path`"""
+    arrays = {}
+    n_lstm = 0
+    for layer in keras_model.layers:
+        kind = type(layer).__name__
+        weights = layer.get_weights()
+        if kind == 'LSTM':
+            config = layer.get_config()
+            if config.get('activation') != 'tanh' or config.get('recurrent_activation') != 'sigmoid':
+                raise ValueError(f"Unsupported LSTM activations in layer {layer.name}")
+            if not config.get('use_bias', True):
+                weights.append(np.zeros(weights[0].shape[1], dtype=weights[0].dtype))
+            arrays[f'lstm{n_lstm}_kernel'], arrays[f'lstm{n_lstm}_recurrent'], arrays[f'lstm{n_lstm}_bias'] = weights
+            n_lstm += 1
+        elif kind == 'Dense':
+            if 'dense_kernel' in arrays or layer.get_config().get('activation') != 'linear':
+                raise ValueError(f"Only a single linear Dense output layer is supported, got {layer.name}")
+            arrays['dense_kernel'], arrays['dense_bias'] = weights
+        elif weights:
+            raise ValueError(f"Unsupported layer with weights: {kind}")
+    if not n_lstm or 'dense_kernel' not in arrays:
+        raise ValueError("Expected LSTM layers followed by a Dense layer")
+
+    arrays = {name: np.asarray(value, dtype=np.float32) for name, value in arrays.items()}
+    np.savez_compressed(
+        path,
+        n_lstm=np.int64(n_lstm),
+        lookback=np.int64(keras_model.input_shape[1]),
+        scaler_min=np.asarray(data_scaler.min_, dtype=np.float64),
+        scaler_scale=np.asarray(data_scaler.scale_, dtype=np.float64),
+        **arrays
+    )
+
+
+def _sigmoid(x):
+    # Written via tanh so large negative inputs don't overflow exp()
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+class NumpyForecaster:
+    """Pure NumPy forward pass for one or more exported forecasters.
+
+    Weights carry a leading model axis (length 1 for a single ticker), so stacked
+    forecasters run every ticker's window through one set of batched matmuls.
+    """
+
+    def __init__(self, lstm_layers, dense_kernel, dense_bias, scaler_min, scaler_scale, lookback):
+        self.lstm_layers = lstm_layers
+        self.dense_kernel = dense_kernel
+        self.dense_bias = dense_bias
+        self.scaler_min = scaler_min
+        self.scaler_scale = scaler_scale
+        self.lookback = lookback
+
+    @classmethod
+    def load(cls, path):
+        """Load an export, or None if it predates the window length being stored"""
+        with np.load(path) as f:
+            if 'lookback' not in f:
+                return None
+            layers = [(f[f'lstm{i}_kernel'][None], f[f'lstm{i}_recurrent'][None], f[f'lstm{i}_bias'][None])
+                      for i in range(int(f['n_lstm']))]
+            return cls(layers, f['dense_kernel'][None], f['dense_bias'][None],
+                       f['scaler_min'][None], f['scaler_scale'][None], int(f['lookback']))
+
+    @property
+    def architecture(self):
+        """Window length and weight shapes; forecasters can be stacked only if these match"""
+        shapes = [tuple(w.shape[1:]) for layer in self.lstm_layers for w in layer]
+        return self.lookback, tuple(shapes), self.dense_kernel.shape[1:]
+
+    @classmethod
+    def stack(cls, forecasters):
+        """Combine forecasters with identical architectures into one vectorized forecaster"""
+        if len({f.architecture for f in forecasters}) > 1:
+            raise ValueError("Only forecasters with identical architectures can be stacked")
+        layers = [tuple(np.concatenate([f.lstm_layers[i][j] for f in forecasters]) for j in range(3))
+                  for i in range(len(forecasters[0].lstm_layers))]
+        return cls(layers,
+                   np.concatenate([f.dense_kernel for f in forecasters]),
+                   np.concatenate([f.dense_bias for f in forecasters]),
+                   np.concatenate([f.scaler_min for f in forecasters]),
+                   np.concatenate([f.scaler_scale for f in forecasters]),
+                   forecasters[0].lookback)
+
+    def forward(self, X):
+        """Run scaled windows X of shape (models, batch, steps, 1) through the network.
+
+        Returns scaled forecasts of shape (models, batch, horizon).
+        """
+        seq = np.asarray(X, dtype=np.float32)
+        for kernel, recurrent, bias in self.lstm_layers:
+            units = recurrent.shape[1]
+            models, batch, steps, _ = seq.shape
+            # Input projections for every time step at once; only the recurrence is sequential
+            projected = seq @ kernel[:, None] + bias[:, None, None]
+            h = np.zeros((models, batch, units), dtype=np.float32)
+            c = np.zeros((models, batch, units), dtype=np.float32)
+            outputs = np.empty((models, batch, steps, units), dtype=np.float32)
+            for t in range(steps):
+                # Keras gate order: input, forget, cell candidate, output
+                z = projected[:, :, t] + h @ recurrent
+                i = _sigmoid(z[..., :units])
+                f = _sigmoid(z[..., units:2 * units])
+                g = np.tanh(z[..., 2 * units:3 * units])
+                o = _sigmoid(z[..., 3 * units:])
+                c = f * c + i * g
+                h = o * np.tanh(c)
+                outputs[:, :, t] = h
+            seq = outputs
+        return seq[:, :, -1] @ self.dense_kernel + self.dense_bias[:, None]
+
+    def predict(self, windows):
+        """Forecast from raw price windows, anchored to the last price like predict_single_stock.
+
+        `windows` is (lookback,) for a single forecaster or (models, lookback) for a stacked
+        one, holding each ticker's most recent `self.lookback` closes. Returns (horizon,) or
+        (models, horizon).
+        """
+        windows = np.asarray(windows, dtype=np.float64)
+        single = windows.ndim == 1
+        windows = np.atleast_2d(windows)
+        scale, offset = self.scaler_scale[:, :1], self.scaler_min[:, :1]
+        scaled = windows * scale + offset
+        forecast = (self.forward(scaled[:, None, :, None])[:, 0] - offset) / scale
+        forecast = forecast * (windows[:, -1:] / forecast[:, :1])
+        return forecast[0] if single else forecast
+
+
+def load_latest(ticker, hparams=None):
+    """NumpyForecaster for the newest exported checkpoint of a ticker (for `hparams`, or any), or None.
+
+    The window length comes from the export itself, so checkpoints of any architecture
+    are served with the input they were trained on.
+    """
+    entry = model_registry.latest(ticker, hparams)
+    if entry is None or not entry.get('npz_path'):
+        return None
+    return NumpyForecaster.load(entry['npz_path'])
+
+
+def forecast_tickers(tickers, hparams=None, years=2):
+    """Forecast many tickers without TensorFlow, one stacked forward pass per architecture.
+
+    Returns {ticker: (prediction, actual)} for tickers with an exported checkpoint and
+    enough cached history; `actual` is a PriceSeries of the last len(prediction) closes.
+    """
+    end_date = datetime.today()
+    start_date = end_date - timedelta(days=365*years)
+    groups = {}
+    for ticker in tickers:
+        forecaster = load_latest(ticker, hparams)
+        if forecaster is None:
+            continue
+        prices = PriceSeries(*load_prices(ticker, start_date, end_date), ticker)
+        if len(prices) < forecaster.lookback:
+            continue
+        groups.setdefault(forecaster.architecture, []).append((ticker, forecaster, prices))
+
+    results = {}
+    for members in groups.values():
+        names, forecasters, series = zip(*members)
+        lookback = forecasters[0].lookback
+        windows = np.array([prices.values[-lookback:] for prices in series])
+        predictions = NumpyForecaster.stack(forecasters).predict(windows)
+        horizon = predictions.shape[1]
+        for i, ticker in enumerate(names):
+            results[ticker] = (predictions[i], series[i][-horizon:])
+    return results
@@ -0,0 +1,246 @@
+"""Long-only mean-variance portfolios over the recommendation universe.
+
+The covariance of daily returns is estimated with Ledoit-Wolf shrinkage towards a scaled
+identity, which keeps it well conditioned even with more tickers than trading days.
+Minimum-variance and maximum-Sharpe weights are found by projected gradient steps onto
+the capped simplex (weights >= 0, each <= max_weight, summing to 1). That is all
+matrix-vector products, so 500+ tickers solve in well under a second. Covariances are
+cached by ticker set and last price date, so repeated requests skip the estimation.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from price_cache import load_price_matrix
+from risk import RISK_FREE_RATE, TRADING_DAYS
+from tracing import span
+from universe import load_universe
+
+OBJECTIVES = ('min_variance', 'max_sharpe')
+
+# Largest share of the amount placed in a single stock
+MAX_WEIGHT = 0.2
+
+# Prices a ticker needs in the window to be included
+MIN_HISTORY = 60
+
+# Weights below this are treated as zero when reporting allocations
+MIN_WEIGHT = 1e-4
+
+# Projected gradient iterations and the change in weights treated as converged
+MAX_ITERATIONS = 2000
+TOLERANCE = 1e-7
+
+# Covariance estimates kept for reuse between requests
+COV_CACHE_SIZE = 8
+
+_cov_cache = OrderedDict()
+_cov_lock = threading.Lock()
+
+
+def ledoit_wolf(returns):
+    """Ledoit-Wolf shrunk covariance of a (days, tickers) return array.
+
+    Missing returns are filled with the column mean (contributing nothing to the
+    covariance), and each entry is averaged over the days both tickers have returns, so
+    tickers with shorter histories can be included without looking less risky.
+    Returns (covariance, shrinkage intensity in [0, 1]).
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    observed = (~np.isnan(returns)).astype(np.float64)
+    # Days each pair of tickers was observed together
+    counts = np.maximum(observed.T @ observed, 1)
+    X = returns - np.nanmean(returns, axis=0)
+    X = np.nan_to_num(X, nan=0.0)
+    n = X.shape[1]
+    sample = X.T @ X / counts
+    mu = np.trace(sample) / n
+    # Distance of the sample covariance from the target, and the sampling error of its entries
+    delta = ((sample - mu * np.eye(n)) ** 2).sum() / n
+    X2 = X ** 2
+    beta = min(((X2.T @ X2 / counts - sample ** 2) / counts).sum() / n, delta)
+    shrinkage = beta / delta if delta > 0 else 1.0
+    cov = shrinkage * mu * np.eye(n) + (1 - shrinkage) * sample
+    return cov, shrinkage
+
+
+def project_capped_simplex(v, cap=1.0):
+    """Euclidean projection of v onto {w : 0 <= w <= cap, sum(w) = 1}"""
+    n = len(v)
+    if cap * n < 1 - 1e-12:
+        raise ValueError(f"A cap of {cap:.0%} cannot be met with {n} stocks")
+    # sum(clip(v - tau, 0, cap)) is piecewise linear and decreasing in tau, with kinks where
+    # an entry enters (v - tau = cap) or leaves (v - tau = 0) the clipped range
+    kinks = np.sort(np.concatenate([v - cap, v]))
+    # Binary search for the two neighbouring kinks whose totals straddle 1
+    lo, hi = 0, len(kinks) - 1
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if np.clip(v - kinks[mid], 0, cap).sum() > 1:
+            lo = mid
+        else:
+            hi = mid
+    lo_tau, hi_tau = kinks[lo], kinks[hi]
+    lo_sum = np.clip(v - lo_tau, 0, cap).sum()
+    hi_sum = np.clip(v - hi_tau, 0, cap).sum()
+    tau = lo_tau if lo_sum == hi_sum else lo_tau + (lo_sum - 1) * (hi_tau - lo_tau) / (lo_sum - hi_sum)
+    w = np.clip(v - tau, 0, cap)
+    return w / w.sum()
+
+
+def _largest_eigenvalue(cov, iterations=50):
+    v = np.full(len(cov), 1 / np.sqrt(len(cov)))
+    for _ in range(iterations):
+        v = cov @ v
+        v /= np.linalg.norm(v)
+    return float(v @ cov @ v)
+
+
+def min_variance_weights(cov, max_weight=MAX_WEIGHT):
+    """Long-only, capped weights minimising w' cov w (accelerated projected gradient descent)"""
+    n = len(cov)
+    step = 1 / (2 * _largest_eigenvalue(cov))
+    w = z = project_capped_simplex(np.full(n, 1 / n), max_weight)
+    t = 1.0
+    for _ in range(MAX_ITERATIONS):
+        new_w = project_capped_simplex(z - step * 2 * (cov @ z), max_weight)
+        if np.abs(new_w - w).max() < TOLERANCE:
+            return new_w
+        # Nesterov momentum
+        new_t = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        z = new_w + (t - 1) / new_t * (new_w - w)
+        w, t = new_w, new_t
+    return w
+
+
+def max_sharpe_weights(mu, cov, max_weight=MAX_WEIGHT, risk_free_rate=0.0):
+    """Long-only, capped weights maximising (mu - rf)'w / sqrt(w' cov w).
+
+    The Sharpe ratio is quasi-concave where the excess return is positive, so projected
+    gradient ascent from the minimum-variance portfolio reaches the constrained optimum.
+    If no stock beats the risk-free rate, the minimum-variance weights are returned.
+    """
+    excess = np.asarray(mu, dtype=np.float64) - risk_free_rate
+    w = min_variance_weights(cov, max_weight)
+    if excess.max() <= 0:
+        return w
+    step = 1 / (2 * _largest_eigenvalue(cov))
+
+    def sharpe(w):
+        return excess @ w / np.sqrt(w @ cov @ w)
+
+    current = sharpe(w)
+    for _ in range(MAX_ITERATIONS):
+        variance = w @ cov @ w
+        ret = excess @ w
+        grad = (excess * variance - ret * (cov @ w)) / variance ** 1.5
+        # Backtrack so every step improves the ratio
+        scale = np.sqrt(variance) / max(abs(ret), 1e-12)
+        while scale > 1e-8:
+            new_w = project_capped_simplex(w + step * scale * grad, max_weight)
+            if sharpe(new_w) >= current:
+                break
+            scale /= 2
+        else:
+            break
+        moved = np.abs(new_w - w).max()
+        w, current = new_w, sharpe(new_w)
+        if moved < TOLERANCE:
+            break
+    return w
+
+
+def estimate(matrix):
+    """Annualised mean returns and Ledoit-Wolf covariance for a date x ticker price frame, cached.
+
+    Returns (mu, cov, shrinkage). The cache key is the ticker set and the last date, so a
+    new bar or a different universe triggers a fresh estimate.
+    """
+    key = (tuple(matrix.columns), matrix.index[-1], len(matrix))
+    with _cov_lock:
+        if key in _cov_cache:
+            _cov_cache.move_to_end(key)
+            return _cov_cache[key]
+
+    prices = matrix.values.astype(np.float64)
+    returns = prices[1:] / prices[:-1] - 1
+    cov, shrinkage = ledoit_wolf(returns)
+    result = (np.nanmean(returns, axis=0) * TRADING_DAYS, cov * TRADING_DAYS, shrinkage)
+    with _cov_lock:
+        _cov_cache[key] = result
+        while len(_cov_cache) > COV_CACHE_SIZE:
+            _cov_cache.popitem(last=False)
+    return result
+
+
+def allocate(amount, tickers, weights, prices, expected_returns=None, min_weight=MIN_WEIGHT):
+    """Split `amount` by weight into rupee allocations, largest first.
+
+    `shares` is the whole number of shares the allocation buys and `invested` their cost.
+    """
+    allocations = []
+    for i in np.argsort(-weights):
+        if weights[i] < min_weight:
+            continue
+        shares = int(amount * weights[i] // prices[i])
+        allocations.append({
+            'ticker': tickers[i],
+            'stock': tickers[i].replace('.NS', ''),
+            'weight': float(weights[i]),
+            'amount': float(amount * weights[i]),
+            'price': float(prices[i]),
+            'shares': shares,
+            'invested': float(shares * prices[i]),
+            'expected_return': float(expected_returns[i]) if expected_returns is not None else None,
+        })
+    return allocations
+
+
+def optimize_portfolio(amount, objective='min_variance', tickers=None, max_weight=MAX_WEIGHT, years=2,
+                       risk_free_rate=RISK_FREE_RATE):
+    """Allocate `amount` across the universe (or `tickers`) for the given objective.
+
+    Returns a dict with the objective, per-stock allocations, and the portfolio's annualised
+    expected return, volatility and Sharpe ratio, or None if no prices are available.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; choose from {', '.join(OBJECTIVES)}")
+    tickers = load_universe() if tickers is None else list(tickers)
+    end_date = datetime.today()
+    try:
+        with span('fetch_matrix'):
+            matrix = load_price_matrix(tickers, end_date - timedelta(days=365*years), end_date)
+    except Exception as e:
+        print(f"Error fetching prices for portfolio optimisation: {e}")
+        return None
+    # Recent listings have too few returns to estimate how they move with the rest
+    matrix = matrix.loc[:, matrix.notna().sum() >= MIN_HISTORY]
+    if matrix.empty or len(matrix) < 3:
+        print("No price data available for portfolio optimisation")
+        return None
+
+    # With too few stocks for the cap, the loosest feasible cap is equal weights
+    cap = max(max_weight, 1 / matrix.shape[1])
+    with span('optimize'):
+        mu, cov, shrinkage = estimate(matrix)
+        if objective == 'max_sharpe':
+            weights = max_sharpe_weights(mu, cov, cap, risk_free_rate)
+        else:
+            weights = min_variance_weights(cov, cap)
+
+    last_prices = matrix.ffill().values[-1]
+    expected = float(mu @ weights)
+    volatility = float(np.sqrt(weights @ cov @ weights))
+    allocations = allocate(amount, list(matrix.columns), weights, last_prices, mu)
+    return {
+        'objective': objective,
+        'allocations': allocations,
+        'expected_return': expected,
+        'volatility': volatility,
+        'sharpe': (expected - risk_free_rate) / volatility if volatility > 0 else None,
+        'shrinkage': float(shrinkage),
+        'cash_left': float(amount - sum(a['invested'] for a in allocations)),
+        'max_weight': cap,
+    }
@@ -0,0 +1,455 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from forecast_store import last_market_close
+from tracing import span
+
+# Directory holding one price file per ticker
+CACHE_DIR = os.environ.get(
+    "STOCK_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "prices")
+)
+
+# Optional directory of <TICKER>.csv files (Date, Close columns) used instead of yfinance
+FIXTURES_DIR = os.environ.get("STOCK_FIXTURES_DIR")
+
+# Gap (in calendar days) at the start of a range we accept without downloading,
+# so weekends and exchange holidays don't trigger a download on every call
+HEAD_TOLERANCE_DAYS = 5
+
+# Trailing windows (in bars) of daily returns kept as running statistics next to each
+# price file, alongside the statistics over the full stored history (~252 bars a year)
+RETURN_WINDOWS = (252, 504)
+DEFAULT_RETURN_WINDOW = 504
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+# One lock per ticker so concurrent requests for the same symbol share a single download
+_ticker_locks = {}
+_ticker_locks_guard = threading.Lock()
+
+
+def _day(value):
+    """Convert a date/datetime to days since the epoch"""
+    return int(np.datetime64(value.date() if isinstance(value, datetime) else value, 'D').astype(np.int64))
+
+
+def _end_day(end_date):
+    """Exclusive day bound for a range ending on `end_date` inclusive.
+
+    The bound never goes past the most recent market close, so a range ending today
+    includes today's bar after the close but not a partial bar during the session.
+    """
+    return min(_day(end_date), _day(last_market_close())) + 1
+
+
+def _path(ticker):
+    return os.path.join(CACHE_DIR, ticker.replace('/', '_') + '.npy')
+
+
+def _lock_for(ticker):
+    with _ticker_locks_guard:
+        lock = _ticker_locks.get(ticker)
+        if lock is None:
+            lock = _ticker_locks[ticker] = threading.Lock()
+        return lock
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def cache_stats():
+    """Return a snapshot of cache hit and miss counts"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats['hits'] = 0
+        _stats['misses'] = 0
+
+
+def _read(ticker):
+    """Read the stored (dates, closes) columns for a ticker, or empty arrays"""
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return _empty()
+    # The file is a (2, n) float64 block: row 0 holds dates, row 1 closing prices
+    block = np.load(path, mmap_mode='r')
+    dates = np.array(block[0], dtype=np.int64)
+    closes = np.array(block[1], dtype=np.float64)
+    del block
+    return dates, closes
+
+
+def _write(ticker, dates, closes):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _path(ticker)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.vstack([dates.astype(np.float64), closes]))
+    os.replace(tmp_path, path)
+    _update_return_stats(ticker, dates, closes)
+
+
+def _meta_path(ticker):
+    return os.path.join(CACHE_DIR, ticker.replace('/', '_') + '.meta.json')
+
+
+def _head_checked(ticker):
+    """Earliest day from which the ticker's history was downloaded (days since the epoch), or None.
+
+    No bars exist between this day and the first stored bar, so ranges starting at or
+    after it need no head download, e.g. for recently listed tickers.
+    """
+    try:
+        with open(_meta_path(ticker)) as f:
+            return json.load(f).get('head_checked')
+    except (OSError, ValueError):
+        return None
+
+
+def _mark_head_checked(ticker, start_day):
+    checked = _head_checked(ticker)
+    if checked is not None and checked <= start_day:
+        return
+    path = _meta_path(ticker)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'head_checked': int(start_day)}, f)
+    os.replace(tmp_path, path)
+
+
+def _last_day(ticker):
+    """Date of the newest stored bar (days since the epoch) without reading the whole file, or None"""
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return None
+    block = np.load(path, mmap_mode='r')
+    last = int(block[0, -1]) if block.shape[1] else None
+    del block
+    return last
+
+
+def _return_stats_path(ticker):
+    return os.path.join(CACHE_DIR, ticker.replace('/', '_') + '.stats.json')
+
+
+def _welford_add(acc, x):
+    count, mean, m2 = acc
+    count += 1
+    delta = x - mean
+    mean += delta / count
+    return [count, mean, m2 + delta * (x - mean)]
+
+
+def _welford_remove(acc, x):
+    count, mean, m2 = acc
+    if count <= 1:
+        return [0, 0.0, 0.0]
+    count -= 1
+    delta = x - mean
+    mean -= delta / count
+    return [count, mean, max(m2 - delta * (x - mean), 0.0)]
+
+
+def _accumulate(returns):
+    """[count, mean, M2] of an array of returns, as Welford's method would leave them"""
+    if len(returns) == 0:
+        return [0, 0.0, 0.0]
+    mean = float(returns.mean())
+    return [len(returns), mean, float(((returns - mean) ** 2).sum())]
+
+
+def _rebuild_return_stats(dates, closes):
+    returns = closes[1:] / closes[:-1] - 1
+    return {
+        'last_date': int(dates[-1]),
+        'last_close': float(closes[-1]),
+        'full': _accumulate(returns),
+        'windows': {str(w): _accumulate(returns[-w:]) for w in RETURN_WINDOWS},
+    }
+
+
+def _update_return_stats(ticker, dates, closes):
+    """Bring the running return statistics up to date with the stored series.
+
+    Bars appended after the last recorded one are folded in one at a time: each adds its
+    return and, for the trailing windows, removes the return that falls out of the window.
+    Anything else (older history filled in, revised closes, changed windows) triggers a rebuild.
+    """
+    if len(dates) < 2:
+        return
+    path = _return_stats_path(ticker)
+    stats = None
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            stats = None
+
+    last = int(np.searchsorted(dates, stats['last_date'])) if stats else -1
+    incremental = (
+        stats is not None
+        and last < len(dates) and dates[last] == stats['last_date']
+        and closes[last] == stats['last_close']
+        and stats['full'][0] == last
+        and sorted(stats['windows']) == sorted(str(w) for w in RETURN_WINDOWS)
+    )
+    if not incremental:
+        stats = _rebuild_return_stats(dates, closes)
+    else:
+        for i in range(last + 1, len(dates)):
+            r = float(closes[i] / closes[i - 1] - 1)
+            stats['full'] = _welford_add(stats['full'], r)
+            for w in RETURN_WINDOWS:
+                acc = _welford_add(stats['windows'][str(w)], r)
+                if i > w:
+                    # Return i - w has just left the trailing window of w returns
+                    acc = _welford_remove(acc, float(closes[i - w] / closes[i - w - 1] - 1))
+                stats['windows'][str(w)] = acc
+        stats['last_date'] = int(dates[-1])
+        stats['last_close'] = float(closes[-1])
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, path)
+
+
+def read_return_stats(ticker, window=DEFAULT_RETURN_WINDOW):
+    """Stored {current_price, avg_return, std_return} over the trailing `window` returns
+    (the full history if None), or None if nothing is stored"""
+    path = _return_stats_path(ticker)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            stats = json.load(f)
+        count, mean, m2 = stats['full'] if window is None else stats['windows'][str(window)]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring return statistics for {ticker}: {e}")
+        return None
+    if count < 2:
+        return None
+    return {
+        'current_price': stats['last_close'],
+        'avg_return': mean,
+        # Sample standard deviation (ddof=1), as pandas' std() gives
+        'std_return': (m2 / (count - 1)) ** 0.5,
+    }
+
+
+def _checked_since_close(ticker):
+    """True if the ticker was topped up since the last market close.
+
+    A check during the session doesn't count, so the first request after the close
+    still picks up the day's bar.
+    """
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return False
+    return datetime.fromtimestamp(os.path.getmtime(path)) >= last_market_close()
+
+
+def _series_arrays(close):
+    """Turn a Close series into (dates, closes) arrays"""
+    close = close.dropna()
+    dates = close.index.values.astype('datetime64[D]').astype(np.int64)
+    return dates, close.values.astype(np.float64)
+
+
+def _normalize_frame(df):
+    """Turn a yfinance/CSV frame into (dates, closes) arrays"""
+    close = df['Close']
+    # Newer yfinance versions return a (field, ticker) column MultiIndex even for one ticker
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    return _series_arrays(close)
+
+
+def _empty():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+
+def _download(ticker, start_day, end_day):
+    """Fetch closes for [start_day, end_day) from the fixtures directory or yfinance"""
+    start = np.datetime64(start_day, 'D')
+    end = np.datetime64(end_day, 'D')
+    if FIXTURES_DIR:
+        path = os.path.join(FIXTURES_DIR, f"{ticker}.csv")
+        if not os.path.exists(path):
+            return _empty()
+        df = pd.read_csv(path, parse_dates=['Date'], index_col='Date')
+        df = df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+    else:
+        import yfinance as yf
+        df = yf.download(ticker, start=str(start), end=str(end), progress=False, auto_adjust=False)
+    if df is None or df.empty:
+        return _empty()
+    return _normalize_frame(df)
+
+
+def _download_many(tickers, start_day, end_day):
+    """Fetch closes for several tickers with a single batched, threaded yfinance request"""
+    if FIXTURES_DIR or len(tickers) == 1:
+        return {ticker: _download(ticker, start_day, end_day) for ticker in tickers}
+    import yfinance as yf
+    df = yf.download(tickers, start=str(np.datetime64(start_day, 'D')), end=str(np.datetime64(end_day, 'D')),
+                     progress=False, auto_adjust=False, group_by='column', threads=True)
+    if df is None or df.empty:
+        return {}
+    close = df['Close']
+    return {ticker: _series_arrays(close[ticker]) for ticker in tickers if ticker in close.columns}
+
+
+def merge(dates, closes, new_dates, new_closes):
+    """Merge two date-sorted series, preferring the newer values on overlapping dates"""
+    all_dates = np.concatenate([dates, new_dates])
+    all_closes = np.concatenate([closes, new_closes])
+    # np.unique keeps the first occurrence, so search the reversed arrays to keep the newest value
+    _, idx = np.unique(all_dates[::-1], return_index=True)
+    idx = len(all_dates) - 1 - idx
+    return all_dates[idx], all_closes[idx]
+
+
+def _missing_ranges(ticker, dates, start_day, end_day):
+    if len(dates) == 0:
+        return [(start_day, end_day)]
+    ranges = []
+    if dates[0] - start_day > HEAD_TOLERANCE_DAYS:
+        checked = _head_checked(ticker)
+        if checked is None or checked > start_day:
+            ranges.append((start_day, int(dates[0])))
+    if dates[-1] + 1 < end_day and not _checked_since_close(ticker):
+        ranges.append((int(dates[-1]) + 1, end_day))
+    return ranges
+
+
+def load_prices(ticker, start_date, end_date):
+    """Return (dates, closes) for [start_date, end_date], downloading only the missing ranges.
+
+    Dates are returned as a datetime64[D] array. If a download fails, whatever is
+    already cached is served so the app keeps working offline.
+    """
+    start_day, end_day = _day(start_date), _end_day(end_date)
+    with _lock_for(ticker):
+        dates, closes = _read(ticker)
+        ranges = _missing_ranges(ticker, dates, start_day, end_day)
+        if ranges:
+            _count('misses')
+            try:
+                for lo, hi in ranges:
+                    with span('download', ticker):
+                        new_dates, new_closes = _download(ticker, lo, hi)
+                    dates, closes = merge(dates, closes, new_dates, new_closes)
+                # Rewriting also refreshes the mtime, marking the ticker as checked today
+                if len(dates):
+                    _write(ticker, dates, closes)
+                    if ranges[0][0] == start_day:
+                        _mark_head_checked(ticker, start_day)
+            except Exception as e:
+                print(f"Error downloading {ticker}, serving cached data: {e}")
+        else:
+            _count('hits')
+
+    mask = (dates >= start_day) & (dates < end_day)
+    return dates[mask].astype('datetime64[D]'), closes[mask]
+
+
+def _top_up(tickers, start_day, end_day):
+    """Read the stored series of several tickers, topping up stale ones in one batched download.
+
+    Returns {ticker: (dates, closes)} with the full stored history.
+    """
+    # Take the per-ticker locks in a fixed order so overlapping batches can't deadlock
+    locks = [_lock_for(ticker) for ticker in sorted(tickers)]
+    for lock in locks:
+        lock.acquire()
+    try:
+        stored = {ticker: _read(ticker) for ticker in tickers}
+        stale = {}
+        for ticker in tickers:
+            ranges = _missing_ranges(ticker, stored[ticker][0], start_day, end_day)
+            if ranges:
+                stale[ticker] = ranges
+            _count('misses' if ranges else 'hits')
+
+        if stale:
+            lo = min(ranges[0][0] for ranges in stale.values())
+            hi = max(ranges[-1][1] for ranges in stale.values())
+            try:
+                with span('download_batch'):
+                    fetched = _download_many(list(stale), lo, hi)
+                for ticker in stale:
+                    new_dates, new_closes = fetched.get(ticker, _empty())
+                    dates, closes = merge(*stored[ticker], new_dates, new_closes)
+                    stored[ticker] = dates, closes
+                    if len(dates):
+                        _write(ticker, dates, closes)
+                        # The batch covered this ticker's whole head gap
+                        if ticker in fetched and stale[ticker][0][0] == start_day:
+                            _mark_head_checked(ticker, start_day)
+            except Exception as e:
+                print(f"Error downloading {len(stale)} tickers, serving cached data: {e}")
+    finally:
+        for lock in locks:
+            lock.release()
+    return stored
+
+
+def load_price_matrix(tickers, start_date, end_date):
+    """Return an aligned date x ticker frame of closes for [start_date, end_date].
+
+    Every ticker that needs topping up is fetched in one batched download covering
+    the union of their missing ranges, instead of one round trip per ticker.
+    """
+    start_day, end_day = _day(start_date), _end_day(end_date)
+    stored = _top_up(list(dict.fromkeys(tickers)), start_day, end_day)
+
+    columns = {}
+    for ticker, (dates, closes) in stored.items():
+        mask = (dates >= start_day) & (dates < end_day)
+        if mask.any():
+            columns[ticker] = pd.Series(closes[mask], index=pd.DatetimeIndex(dates[mask].astype('datetime64[D]')))
+    return pd.DataFrame(columns).sort_index()
+
+
+def load_return_stats(tickers, start_date, end_date, window=DEFAULT_RETURN_WINDOW):
+    """Return {ticker: {current_price, avg_return, std_return}} from the running statistics.
+
+    Only tickers whose newest bar is behind `end_date` and that were not checked since the close are
+    topped up (in one batched download, which also updates their statistics). Fresh tickers
+    cost one small file read, however long their history.
+    """
+    start_day, end_day = _day(start_date), _end_day(end_date)
+    tickers = list(dict.fromkeys(tickers))
+    stale = []
+    for ticker in tickers:
+        last = _last_day(ticker)
+        if last is None or not os.path.exists(_return_stats_path(ticker)) or \
+                (last + 1 < end_day and not _checked_since_close(ticker)):
+            stale.append(ticker)
+    if stale:
+        stored = _top_up(stale, start_day, end_day)
+        for ticker in stale:
+            # Series cached before statistics were kept get theirs built once
+            if not os.path.exists(_return_stats_path(ticker)):
+                _update_return_stats(ticker, *stored[ticker])
+
+    stats = {}
+    for ticker in tickers:
+        ticker_stats = read_return_stats(ticker, window)
+        if ticker_stats is not None:
+            stats[ticker] = ticker_stats
+    return stats
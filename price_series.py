@@ -0,0 +1,131 @@
+"""Compact closing-price series used in place of single-column DataFrames.
+
+A PriceSeries holds int64 day numbers (days since the epoch) and float32 closes. Slicing
+returns views over the same buffers, and derived series (returns, rolling statistics) are
+computed once and cached on the instance.
+"""
+from datetime import date
+
+import numpy as np
+
+
+class PriceSeries:
+    """Dates and closes for one ticker, backed by two NumPy arrays"""
+
+    __slots__ = ('ticker', 'dates', 'values', '_cache')
+
+    def __init__(self, dates, values, ticker=None):
+        dates = np.asarray(dates)
+        if dates.dtype.kind == 'M':
+            dates = dates.astype('datetime64[D]').view(np.int64)
+        self.ticker = ticker
+        self.dates = dates.astype(np.int64, copy=False)
+        self.values = np.asarray(values, dtype=np.float32)
+        self._cache = {}
+        if len(self.dates) != len(self.values):
+            raise ValueError(f"{len(self.dates)} dates for {len(self.values)} prices")
+
+    @classmethod
+    def from_pandas(cls, series, ticker=None):
+        """Build from a date-indexed pandas Series, dropping missing values"""
+        series = series.dropna()
+        return cls(series.index.values, series.values, ticker if ticker is not None else series.name)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return PriceSeries(self.dates[key], self.values[key], self.ticker)
+        return float(self.values[key])
+
+    def __repr__(self):
+        if not len(self):
+            return f"PriceSeries({self.ticker!r}, empty)"
+        return f"PriceSeries({self.ticker!r}, {len(self)} bars, {self.first_date} to {self.last_date})"
+
+    def __getstate__(self):
+        # Derived views are cheap to rebuild, so they are not pickled to worker processes
+        return self.ticker, self.dates, self.values
+
+    def __setstate__(self, state):
+        self.ticker, self.dates, self.values = state
+        self._cache = {}
+
+    @property
+    def index(self):
+        """Dates as a datetime64[D] view"""
+        return self.dates.view('datetime64[D]')
+
+    @property
+    def first_date(self):
+        return date.fromordinal(date(1970, 1, 1).toordinal() + int(self.dates[0]))
+
+    @property
+    def last_date(self):
+        return date.fromordinal(date(1970, 1, 1).toordinal() + int(self.dates[-1]))
+
+    @property
+    def last(self):
+        return float(self.values[-1])
+
+    def column(self):
+        """Closes as an (n, 1) view, the shape scikit-learn scalers expect"""
+        return self.values[:, np.newaxis]
+
+    def _cached(self, key, compute):
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = compute()
+            value.flags.writeable = False
+        return value
+
+    @property
+    def returns(self):
+        """Daily simple returns, one shorter than the series"""
+        return self._cached('returns', lambda: self.values[1:] / self.values[:-1] - 1)
+
+    @property
+    def log_returns(self):
+        return self._cached('log_returns', lambda: np.diff(np.log(self.values)))
+
+    def mean_return(self):
+        return float(self.returns.mean(dtype=np.float64))
+
+    def std_return(self):
+        """Sample standard deviation of daily returns (ddof=1, like pandas)"""
+        return float(self.returns.std(dtype=np.float64, ddof=1)) if len(self.returns) > 1 else float('nan')
+
+    def _window_sums(self, window):
+        """Sums of values and squared values over each trailing window, from float64 running totals"""
+        def compute():
+            values = self.values.astype(np.float64)
+            totals = np.zeros((2, len(values) + 1))
+            np.cumsum(values, out=totals[0, 1:])
+            np.cumsum(values * values, out=totals[1, 1:])
+            return totals[:, window:] - totals[:, :-window]
+        return self._cached(('window_sums', window), compute)
+
+    def rolling_mean(self, window):
+        """Mean over each trailing window, aligned to the window's last bar (len - window + 1 values)"""
+        return self._cached(('rolling_mean', window),
+                            lambda: (self._window_sums(window)[0] / window).astype(np.float32))
+
+    def rolling_std(self, window):
+        """Sample std over each trailing window, aligned like rolling_mean"""
+        def compute():
+            sums, squares = self._window_sums(window)
+            variance = np.maximum(squares - sums * sums / window, 0) / (window - 1)
+            return np.sqrt(variance).astype(np.float32)
+        return self._cached(('rolling_std', window), compute)
+
+    def since(self, day):
+        """Bars strictly after `day` (a date or day number) as a view"""
+        if isinstance(day, date):
+            day = int(np.datetime64(day, 'D').astype(np.int64))
+        return self[int(np.searchsorted(self.dates, day, side='right')):]
+
+    def to_frame(self):
+        """The series as a DataFrame with a Close column, for plotting or export"""
+        import pandas as pd
+        return pd.DataFrame({'Close': self.values}, index=pd.DatetimeIndex(self.index, name='Date'))
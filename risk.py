@@ -0,0 +1,127 @@
+"""Vectorized risk metrics over a date x ticker price matrix.
+
+Every metric is computed column-wise in a single NumPy pass (missing prices are NaN),
+so hundreds of tickers take milliseconds and nothing loops over tickers in Python.
+"""
+import warnings
+from statistics import NormalDist
+
+import numpy as np
+
+TRADING_DAYS = 252
+
+# Annual risk-free rate used by the Sharpe and Sortino ratios (roughly the Indian T-bill yield)
+RISK_FREE_RATE = 0.065
+
+# One-day value-at-risk confidence level
+VAR_CONFIDENCE = 0.95
+
+# Benchmark for beta
+INDEX_TICKER = '^NSEI'
+
+# Metrics the recommender can rank by, and whether higher values rank first.
+# Drawdown is negative (e.g. -0.35), so the shallowest drawdown ranks first.
+RANK_METRICS = {
+    'profit': True,
+    'sharpe': True,
+    'sortino': True,
+    'volatility': False,
+    'max_drawdown': True,
+    'var_historical': False,
+    'var_parametric': False,
+    'beta': False,
+    'prob_loss': False,
+}
+
+RISK_METRICS = ('volatility', 'max_drawdown', 'sharpe', 'sortino', 'var_historical', 'var_parametric', 'beta')
+
+
+def _beta(returns, index_returns):
+    """Beta of each column against the index, over the days both have a return"""
+    market = index_returns[:, np.newaxis]
+    both = ~np.isnan(returns) & ~np.isnan(market)
+    n = both.sum(axis=0)
+    r = np.where(both, returns, 0.0)
+    m = np.where(both, market, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r_mean = r.sum(axis=0) / n
+        m_mean = m.sum(axis=0) / n
+        cov = (np.where(both, (r - r_mean) * (m - m_mean), 0.0)).sum(axis=0) / (n - 1)
+        var = (np.where(both, (m - m_mean) ** 2, 0.0)).sum(axis=0) / (n - 1)
+        return np.where(n > 2, cov / var, np.nan)
+
+
+def risk_metrics(prices, index_prices=None, risk_free_rate=RISK_FREE_RATE, confidence=VAR_CONFIDENCE):
+    """Risk metrics for each column of a (days, tickers) price array.
+
+    `index_prices` is a (days,) array on the same dates, for beta. Returns a dict of
+    (tickers,) arrays:
+    - volatility: annualised standard deviation of daily returns
+    - max_drawdown: worst fall from a running peak, as a negative fraction
+    - sharpe, sortino: annualised excess return over total and downside deviation
+    - var_historical, var_parametric: one-day loss not exceeded with `confidence`, as a
+      positive fraction of the position (empirical quantile and normal approximation)
+    - beta: sensitivity to the index (NaN without one)
+    Columns with fewer than two returns get NaN.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.ndim == 1:
+        prices = prices[:, np.newaxis]
+    returns = prices[1:] / prices[:-1] - 1
+    daily_rf = risk_free_rate / TRADING_DAYS
+    counts = (~np.isnan(returns)).sum(axis=0)
+    valid = counts >= 2
+
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        # All-NaN columns are expected for tickers without data; they come out as NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(returns, axis=0)
+        std = np.nanstd(returns, axis=0, ddof=1)
+        excess = mean - daily_rf
+        downside = np.sqrt(np.nanmean(np.minimum(returns - daily_rf, 0.0) ** 2, axis=0))
+
+        # fmax ignores NaN, so gaps carry the previous peak forward
+        peaks = np.fmax.accumulate(prices, axis=0)
+        max_drawdown = np.nanmin(prices / peaks - 1, axis=0)
+
+        z = NormalDist().inv_cdf(1 - confidence)
+        var_historical = -np.nanpercentile(returns, (1 - confidence) * 100, axis=0)
+        var_parametric = -(mean + z * std)
+
+        metrics = {
+            'volatility': std * np.sqrt(TRADING_DAYS),
+            'max_drawdown': max_drawdown,
+            'sharpe': excess / std * np.sqrt(TRADING_DAYS),
+            'sortino': excess / downside * np.sqrt(TRADING_DAYS),
+            'var_historical': var_historical,
+            'var_parametric': var_parametric,
+        }
+    if index_prices is not None:
+        index_prices = np.asarray(index_prices, dtype=np.float64)
+        metrics['beta'] = _beta(returns, index_prices[1:] / index_prices[:-1] - 1)
+    else:
+        metrics['beta'] = np.full(prices.shape[1], np.nan)
+    return {name: np.where(valid, values, np.nan) for name, values in metrics.items()}
+
+
+def matrix_risk_metrics(matrix, index=None, **kwargs):
+    """Per-ticker risk metrics for a date x ticker DataFrame, as {ticker: {metric: value}}.
+
+    `index` is an optional price Series for beta; it is aligned to the matrix dates.
+    """
+    if matrix is None or matrix.empty:
+        return {}
+    index_prices = index.reindex(matrix.index).values if index is not None else None
+    metrics = risk_metrics(matrix.values, index_prices, **kwargs)
+    return {
+        ticker: {name: (float(values[i]) if np.isfinite(values[i]) else None) for name, values in metrics.items()}
+        for i, ticker in enumerate(matrix.columns)
+    }
+
+
+def rank_key(result, metric):
+    """Sort key putting the best value of `metric` first when sorted descending; None if missing"""
+    value = result.get(metric)
+    if value is None or not np.isfinite(value):
+        return None
+    return value if RANK_METRICS[metric] else -value
@@ -0,0 +1,97 @@
+"""Precompute daily forecasts and recommendation statistics after market close.
+
+Run `python scheduler.py` to keep running and refresh the forecast store every
+weekday after the close, or `python scheduler.py --now` to refresh once. With
+--backtest-minutes, each refresh is followed by a walk-forward backtest within that budget.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import forecast_store
+import tracing
+from model import CHUNK_SIZE, fetch_return_stats, predict_many
+from universe import load_universe
+
+# Minutes after the close to wait for the day's final bars to be published
+RUN_DELAY_MINUTES = 30
+
+
+def precompute(tickers=None, workers=None):
+    """Refresh stats and 10-day forecasts for every ticker in the forecast store"""
+    tickers = list(tickers if tickers is not None else load_universe())
+    started = time.perf_counter()
+
+    for start in range(0, len(tickers), CHUNK_SIZE):
+        for ticker, stats in fetch_return_stats(tickers[start:start + CHUNK_SIZE]).items():
+            forecast_store.save_stats(ticker, stats)
+
+    failed = []
+    for ticker, prediction, actual, band, error in predict_many(tickers, workers=workers):
+        if error:
+            print(f"Forecast failed for {ticker}: {error}")
+            failed.append(ticker)
+        else:
+            forecast_store.save_forecast(ticker, prediction, actual, band)
+
+    print(f"Precomputed {len(tickers) - len(failed)}/{len(tickers)} tickers "
+          f"in {time.perf_counter() - started:.1f}s")
+    tracing.observe('precompute', time.perf_counter() - started)
+    tracing.write_metrics()
+    return failed
+
+
+def next_run(now=None):
+    """Next weekday close plus RUN_DELAY_MINUTES that is still in the future"""
+    now = now or datetime.now()
+    run_at = datetime.combine(now.date(), forecast_store.MARKET_CLOSE) + timedelta(minutes=RUN_DELAY_MINUTES)
+    while run_at <= now or run_at.weekday() >= 5:
+        run_at += timedelta(days=1)
+    return run_at
+
+
+def run_backtest(tickers=None, workers=None, budget_minutes=None):
+    """Walk-forward backtest within a time budget, saved to the backtest report directory"""
+    import backtest
+    results = backtest.backtest(tickers, workers=workers, budget_seconds=budget_minutes * 60)
+    path = backtest.save_report(results, budget_minutes=budget_minutes)
+    print(f"Backtest report written to {path}")
+
+
+def run_forever(tickers=None, workers=None, backtest_minutes=None):
+    while True:
+        run_at = next_run()
+        print(f"Next precompute at {run_at:%Y-%m-%d %H:%M}")
+        time.sleep(max(0, (run_at - datetime.now()).total_seconds()))
+        try:
+            precompute(tickers, workers)
+        except Exception as e:
+            print(f"Precompute failed: {e}")
+        if backtest_minutes:
+            try:
+                run_backtest(tickers, workers, backtest_minutes)
+            except Exception as e:
+                print(f"Backtest failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--now', action='store_true', help="refresh once and exit")
+    parser.add_argument('--workers', type=int, default=None, help="forecasting worker processes")
+    parser.add_argument('--backtest-minutes', type=float, default=None,
+                        help="also run a walk-forward backtest with this time budget")
+    parser.add_argument('tickers', nargs='*', help="tickers to precompute (default: the configured universe)")
+    args = parser.parse_args()
+
+    tickers = args.tickers or None
+    tracing.start_from_env()
+    if args.now:
+        precompute(tickers, args.workers)
+        if args.backtest_minutes:
+            run_backtest(tickers, args.workers, args.backtest_minutes)
+    else:
+        run_forever(tickers, args.workers, args.backtest_minutes)
+
+
+if __name__ == "__main__":
+    main()
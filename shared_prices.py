@@ -0,0 +1,124 @@
+"""Date x ticker closing prices in one shared-memory block for worker processes.
+
+The parent loads the price matrix once and copies it into a `multiprocessing.shared_memory`
+block. Worker processes attach to the block by name and read each ticker's closes as
+PriceSeries views straight out of it. Adding workers therefore adds no copies of the
+price history, and nothing is downloaded or unpickled per worker.
+"""
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from price_series import PriceSeries
+
+# The block this worker process attached to in attach_worker()
+_attached = None
+
+
+def _open(name):
+    # Before Python 3.13, attaching also registers the block with the resource tracker,
+    # which the parent's unlink() unregisters again
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedPriceMatrix:
+    """Closes for many tickers in one shared float32 block.
+
+    The block holds the int64 day numbers followed by the closes, stored ticker-major so
+    each ticker's history is one contiguous row. Missing prices are NaN.
+    """
+
+    def __init__(self, shm, tickers, n_dates, owner=False):
+        self._shm = shm
+        self.tickers = list(tickers)
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.owner = owner
+        self.dates = np.ndarray((n_dates,), dtype=np.int64, buffer=shm.buf)
+        self.closes = np.ndarray((len(self.tickers), n_dates), dtype=np.float32, buffer=shm.buf,
+                                 offset=self.dates.nbytes)
+
+    @classmethod
+    def from_frame(cls, matrix):
+        """Copy a date x ticker DataFrame (as returned by load_price_matrix) into a new block"""
+        n_dates, n_tickers = matrix.shape
+        shm = shared_memory.SharedMemory(create=True, size=max(1, n_dates * 8 + n_dates * n_tickers * 4))
+        shared = cls(shm, matrix.columns, n_dates, owner=True)
+        shared.dates[:] = matrix.index.values.astype('datetime64[D]').astype(np.int64)
+        shared.closes[:] = matrix.values.T
+        return shared
+
+    @classmethod
+    def attach(cls, handle):
+        """Attach to a block created in another process, from its `handle`"""
+        name, tickers, n_dates = handle
+        return cls(_open(name), tickers, n_dates)
+
+    @property
+    def handle(self):
+        """Picklable (name, tickers, n_dates) for attach()"""
+        return self._shm.name, self.tickers, len(self.dates)
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.closes.nbytes
+
+    @property
+    def matrix(self):
+        """The closes as a date x ticker view"""
+        return self.closes.T
+
+    def __contains__(self, ticker):
+        return ticker in self.columns
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def series(self, ticker):
+        """A ticker's closes as a PriceSeries, or None if it has none.
+
+        Histories without gaps (the usual case: NaN only before listing or after the last
+        close) are returned as views into the shared block.
+        """
+        row = self.closes[self.columns[ticker]]
+        valid = ~np.isnan(row)
+        if not valid.any():
+            return None
+        first = int(np.argmax(valid))
+        end = len(valid) - int(np.argmax(valid[::-1]))
+        if valid[first:end].all():
+            return PriceSeries(self.dates[first:end], row[first:end], ticker)
+        return PriceSeries(self.dates[valid], row[valid], ticker)
+
+    def close(self):
+        """Detach, and free the block if this process created it"""
+        self.dates = self.closes = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # A PriceSeries view is still alive; the mapping goes when it does
+            pass
+        if self.owner:
+            self._shm.unlink()
+            self.owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_worker(handle):
+    """Attach this worker process to the parent's block (a pool initializer step)"""
+    global _attached
+    _attached = SharedPriceMatrix.attach(handle) if handle is not None else None
+
+
+def worker_series(ticker):
+    """The ticker's closes from the block this worker attached to, or None"""
+    if _attached is None or ticker not in _attached:
+        return None
+    return _attached.series(ticker)
@@ -0,0 +1,177 @@
+"""Lightweight stage timing for the forecasting pipeline.
+
+Wrap a stage in `with span('fit', ticker):` to record its wall time in a per-stage,
+per-ticker histogram. Metrics can be written in Prometheus text format to a file
+(write_metrics) or served over HTTP (serve_metrics). Set STOCK_METRICS_FILE and/or
+STOCK_METRICS_PORT and call start_from_env() to enable either without code changes.
+"""
+import atexit
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# File the metrics are written to at exit, if set
+METRICS_FILE = os.environ.get("STOCK_METRICS_FILE")
+
+# Port for a Prometheus-text /metrics endpoint, if set
+METRICS_PORT = os.environ.get("STOCK_METRICS_PORT")
+
+# Histogram bucket upper bounds in seconds, covering cache reads through full training runs
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_histograms = {}
+_lock = threading.Lock()
+_server = None
+
+
+class Histogram:
+    """Cumulative-bucket duration histogram in the Prometheus style"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+def observe(stage, seconds, ticker=None):
+    """Record a duration for a stage, optionally attributed to a ticker"""
+    key = (stage, ticker or '')
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+@contextmanager
+def span(stage, ticker=None):
+    """Time the enclosed block as `stage`; failed blocks are recorded as `<stage>_error`"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        observe(stage + '_error', time.perf_counter() - started, ticker)
+        raise
+    observe(stage, time.perf_counter() - started, ticker)
+
+
+def snapshot():
+    """Summary of every histogram as {(stage, ticker): {count, total, mean, max}}"""
+    with _lock:
+        return {key: {'count': h.count, 'total': h.total, 'mean': h.total / h.count, 'max': h.max}
+                for key, h in _histograms.items()}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def drain():
+    """Remove and return the raw histograms, to send from a worker process to merge()"""
+    with _lock:
+        data = {key: (h.counts, h.count, h.total, h.max) for key, h in _histograms.items()}
+        _histograms.clear()
+    return data
+
+
+def merge(data):
+    """Add histograms from drain() in another process into this process's histograms"""
+    with _lock:
+        for key, (counts, count, total, maximum) in data.items():
+            histogram = _histograms.get(key)
+            if histogram is None:
+                histogram = _histograms[key] = Histogram()
+            histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+            histogram.count += count
+            histogram.total += total
+            histogram.max = max(histogram.max, maximum)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text():
+    """All histograms in the Prometheus text exposition format"""
+    name = 'stock_stage_duration_seconds'
+    lines = [f"# HELP {name} Wall time of pipeline stages per ticker",
+             f"# TYPE {name} histogram"]
+    with _lock:
+        items = sorted((key, list(h.counts), h.count, h.total) for key, h in _histograms.items())
+    for (stage, ticker), counts, count, total in items:
+        labels = f'stage="{_escape(stage)}",ticker="{_escape(ticker)}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'{name}_sum{{{labels}}} {total:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path=None):
+    """Write the Prometheus text to `path` (default METRICS_FILE), replacing it atomically"""
+    path = path or METRICS_FILE
+    if not path:
+        return
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error writing metrics to {path}: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """Serve /metrics on a daemon thread; returns the server, or None if the port is unavailable"""
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    except OSError as e:
+        print(f"Could not serve metrics on port {port}: {e}")
+        return None
+    threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+    return _server
+
+
+def start_from_env():
+    """Enable the exports configured through STOCK_METRICS_FILE and STOCK_METRICS_PORT"""
+    if METRICS_FILE:
+        atexit.register(write_metrics)
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
@@ -0,0 +1,25 @@
+import os
+
+# Available stocks (NSE symbols). Kept free of heavy imports so the GUI can
+# list them without loading the forecasting stack.
+STOCKS = ["TCS.NS", "INFY.NS", "RELIANCE.NS", "HDFCBANK.NS", "ICICIBANK.NS"]
+
+# Optional symbol list replacing STOCKS: one symbol per line, or NSE's EQUITY_L.csv
+# (first column SYMBOL). Bare NSE symbols get the ".NS" suffix yfinance expects.
+UNIVERSE_FILE = os.environ.get("STOCK_UNIVERSE_FILE")
+
+def load_universe(path=None):
+    """Return the configured ticker universe, falling back to STOCKS"""
+    path = path or UNIVERSE_FILE
+    if not path:
+        return list(STOCKS)
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            symbol = line.split('#', 1)[0].split(',', 1)[0].strip().upper()
+            if not symbol or symbol == 'SYMBOL':
+                continue
+            if '.' not in symbol and not symbol.startswith('^'):
+                symbol += '.NS'
+            symbols.append(symbol)
+    return list(dict.fromkeys(symbols))